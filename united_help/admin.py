@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Profile, Event, Skill, City, Comment, EventLog, Voting
+from .models import User, Profile, Event, Skill, City, Comment, EventLog, Voting, GeocodeCache, SkillClosure, \
+    WaitlistEntry, NotificationOutbox, DeviceToken
 
 
 @admin.register(User)
@@ -51,3 +52,36 @@ class VotingAdmin(admin.ModelAdmin):
     list_display = ('id', "voter", 'applicant', "score",)
     list_display_links = ('id', "score",)
 
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ('id', "city", "query", "found", "last_used",)
+    list_display_links = ('id', "query",)
+    search_fields = ["city", "query", ]
+
+
+@admin.register(SkillClosure)
+class SkillClosureAdmin(admin.ModelAdmin):
+    list_display = ('id', "ancestor", "descendant", "depth",)
+    list_display_links = ('id',)
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', "event", "profile", "position",)
+    list_display_links = ('id', "event",)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', "title", "status", "merged", "attempts", "next_attempt", "sent",)
+    list_display_links = ('id', "title",)
+    list_filter = ["status", ]
+
+
+@admin.register(DeviceToken)
+class DeviceTokenAdmin(admin.ModelAdmin):
+    list_display = ('id', "user", "platform", "last_seen", "failure_count",)
+    list_display_links = ('id', "user",)
+    search_fields = ["token", ]
+    raw_id_fields = ["user", "topics", ]
@@ -5,5 +5,9 @@ class UnitedHelpConfig(AppConfig):
     name = 'united_help'
 
     def ready(self):
+        import united_help.signals  # noqa: F401
+        from django.core import checks
+        from united_help.subscriptions import check_returning
+        checks.register(check_returning)
         from united_help.scheduler import init_scheduler
         init_scheduler()
@@ -0,0 +1,50 @@
+from rest_framework.utils import json
+
+# notifications of one kind about one event are merged into single push while it waits in outbox,
+# every kind has merge of two states, render of state into title, message and extra data
+# and data keys which describe single actor, so they are dropped from merged push
+
+
+def merge_change(state: dict, new: dict) -> dict:
+    # later value of the same field wins
+    return {'changes': {**state['changes'], **new['changes']}, 'count': state['count'] + new['count']}
+
+
+def render_change(state: dict, data: dict) -> tuple[str, str, dict]:
+    times = f' {state["count"]} times' if state['count'] > 1 else ''
+    title = f'Organizer {data.get("actor_name")} changed івент {data.get("event_name")}{times}.'
+    message = ', '.join(f'{k} is {v}' for k, v in state['changes'].items())
+    return title, message, {'_data': json.dumps(state['changes'])}
+
+
+def merge_participants(state: dict, new: dict) -> dict:
+    # counts of event are taken from the latest state
+    return {**new, 'joined': state['joined'] + new['joined'], 'left': state['left'] + new['left']}
+
+
+def render_participants(state: dict, data: dict) -> tuple[str, str, dict]:
+    event_to, event_name = data.get('event_to', '').lower(), data.get('event_name')
+    progress = f'{state["participants"]}/{state["required"]}'
+    extra = {'_data': json.dumps({
+        'required': state['required'],
+        'participants': state['participants'],
+        'joined': state['joined'],
+        'left': state['left'],
+    })}
+    if (state['joined'], state['left']) == (1, 0):
+        return (f'{event_to.capitalize()} {data.get("actor_name")} приєднується до івента {event_name}.',
+                f'Набрано {state["participants"]} з {state["required"]} {event_to}ів '
+                f'для допомоги в організації івента {event_name}.', extra)
+    if (state['joined'], state['left']) == (0, 1):
+        return (f'You are lost one of volunteers in {event_name}',
+                f'Volunteer {data.get("actor_name")} unsubscribed to event {event_name}, {progress}', extra)
+    counts = ((state['joined'], 'joined'), (state['left'], 'left'))
+    changes = [f'{count} {event_to}s {action}' for count, action in counts if count]
+    return f'Participants of {event_name} changed', f'{", ".join(changes)}, {progress}', extra
+
+
+COALESCERS = {
+    # changes are always made by organizer of event
+    'change': (merge_change, render_change, ()),
+    'participants': (merge_participants, render_participants, ('actor_name', 'actor_profile_id', 'image')),
+}
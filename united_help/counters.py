@@ -0,0 +1,92 @@
+from typing import Iterable
+
+from django.db import connection
+from django.db.models import F, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from united_help.models import Event, Comment, SharedCounter
+
+Participation = Event.participants.through
+
+
+def _count_subquery(queryset):
+    counts = queryset.filter(event_id=OuterRef('pk')).order_by().values('event_id').annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), 0)
+
+
+def participants_subquery():
+    return _count_subquery(Participation.objects.all())
+
+
+def comments_subquery():
+    return _count_subquery(Comment.objects.all())
+
+
+def add_participants(event_ids: Iterable[int], count: int = 1):
+    Event.objects.filter(pk__in=event_ids).update(participants_count=F('participants_count') + count)
+
+
+def add_comments(event_id: int, count: int = 1):
+    Event.objects.filter(pk=event_id).update(comments_count=F('comments_count') + count)
+
+
+def recount_participants(event_ids: Iterable[int]):
+    Event.objects.filter(pk__in=event_ids).update(participants_count=participants_subquery())
+
+
+def recount_comments(event_ids: Iterable[int]):
+    Event.objects.filter(pk__in=event_ids).update(comments_count=comments_subquery())
+
+
+def check_event_counters(fix: bool = False) -> list[tuple[int, int, int, int, int]]:
+    '''
+    return (event_id, participants_count, participants, comments_count, comments) of events with wrong counters
+    '''
+    drifted = list(
+        Event.objects.annotate(participants=participants_subquery(), comments=comments_subquery())
+        .exclude(participants_count=F('participants'), comments_count=F('comments'))
+        .order_by('id')
+        .values_list('id', 'participants_count', 'participants', 'comments_count', 'comments')
+    )
+    if fix and drifted:
+        event_ids = [row[0] for row in drifted]
+        recount_participants(event_ids)
+        recount_comments(event_ids)
+    return drifted
+
+
+def next_shared_value(name: str, step: int = 1) -> int:
+    '''
+    atomically add step to shared counter and return new value
+    '''
+    SharedCounter.objects.get_or_create(name=name)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {SharedCounter._meta.db_table} SET value = value + %s WHERE name = %s RETURNING value',
+            [step, name],
+        )
+        return cursor.fetchone()[0]
+
+
+def shared_value(name: str) -> int:
+    return SharedCounter.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+# uses of one window are kept in the same number as window itself, window * WINDOW_SPAN + uses
+WINDOW_SPAN = 10 ** 6
+
+
+def next_window_value(name: str, window: int) -> int:
+    '''
+    atomically count use of window in shared counter and return uses of it so far,
+    counter starts from zero when the next window comes
+    '''
+    SharedCounter.objects.get_or_create(name=name)
+    start = window * WINDOW_SPAN
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {SharedCounter._meta.db_table} '
+            f'SET value = CASE WHEN value >= %s THEN value + 1 ELSE %s END WHERE name = %s RETURNING value',
+            [start, start + 1, name],
+        )
+        return cursor.fetchone()[0] - start
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from firebase_admin.exceptions import InvalidArgumentError
+from firebase_admin.messaging import UnregisteredError, SenderIdMismatchError
+
+from united_help.models import DeviceToken
+from united_help.settings import DEVICE_TOKEN_MAX_FAILURES, DEVICE_TOKEN_RETRY_AFTER
+from united_help.topics import after_commit, sync_token
+
+# errors which mean that token will never work again
+DEAD_TOKEN_ERRORS = (UnregisteredError, SenderIdMismatchError)
+# errors caused by token itself, unavailable or internal fcm errors are not counted against token
+TOKEN_ERRORS = (InvalidArgumentError,)
+
+
+def register_token(user_id: int, token: str, platform: str = '') -> DeviceToken:
+    '''
+    token moves to user who registered it last, registration makes it healthy again,
+    topics of token follow the user
+    '''
+    device, _ = DeviceToken.objects.update_or_create(
+        token=token,
+        defaults={'user_id': user_id, 'platform': platform, 'last_seen': timezone.now(), 'failure_count': 0},
+    )
+    after_commit(DeviceToken.objects.filter(pk=device.pk), sync_token, device)
+    return device
+
+
+def recipient_tokens(users) -> QuerySet:
+    '''
+    tokens of users in one query, users are 'all', queryset of users, users or their ids,
+    token with too many failures is tried again once per DEVICE_TOKEN_RETRY_AFTER
+    '''
+    tokens = DeviceToken.objects.filter(
+        Q(failure_count__lt=DEVICE_TOKEN_MAX_FAILURES) |
+        Q(last_failure__lt=timezone.now() - timedelta(seconds=DEVICE_TOKEN_RETRY_AFTER))
+    )
+    if users == 'all':
+        return tokens
+    if isinstance(users, QuerySet):
+        return tokens.filter(user__in=users)
+    return tokens.filter(user_id__in=[user if isinstance(user, int) else user.pk for user in users])
+
+
+def record_results(tokens: list[str], responses) -> tuple[int, int]:
+    '''
+    drop dead tokens and count failures of token errors from per-token responses of multicast,
+    return (pruned, failed)
+    '''
+    dead, failed, recovered = [], [], []
+    for token, response in zip(tokens, responses):
+        if response.success:
+            recovered.append(token)
+        elif isinstance(response.exception, DEAD_TOKEN_ERRORS):
+            dead.append(token)
+        elif isinstance(response.exception, TOKEN_ERRORS):
+            failed.append(token)
+    if dead:
+        DeviceToken.objects.filter(token__in=dead).delete()
+    if failed:
+        DeviceToken.objects.filter(token__in=failed).update(
+            failure_count=F('failure_count') + 1, last_failure=timezone.now())
+    if recovered:
+        DeviceToken.objects.filter(token__in=recovered, failure_count__gt=0).update(failure_count=0)
+    return len(dead), len(failed)
@@ -0,0 +1,111 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from rest_framework.utils import json
+
+from united_help.fcm import get_messaging
+from united_help.settings import PUSH_BATCH_SIZE, PUSH_WORKERS, PUSH_BATCH_RETRIES, PUSH_RETRY_DELAY
+
+
+@dataclass
+class PushPayload:
+    notification: object
+    data: dict[str, str]
+
+
+@dataclass
+class BatchResult:
+    tokens: list[str]
+    responses: list = field(default_factory=list)
+    success_count: int = 0
+    attempts: int = 0
+    error: Optional[Exception] = None
+
+
+class PartialDelivery(Exception):
+    '''
+    some batches failed after all retries, tokens are recipients which did not get the push
+    '''
+    def __init__(self, tokens: list[str], stats: dict):
+        super().__init__(f'{len(tokens)} of {stats["len_devices_tokens"]} tokens failed '
+                         f'in {stats["failed_batches"]} of {stats["batches"]} batches')
+        self.tokens = tokens
+        self.stats = stats
+
+
+def build_payload(title: str, message: str, messaging=None, **kwargs) -> PushPayload:
+    '''
+    notification and data are built once and shared by every batch
+    '''
+    messaging = messaging or get_messaging()
+    data = {
+        'title': str(title),
+        'text': str(message),
+        # for ios
+        'content-available': '1',
+        'aps': json.dumps({
+            'category': 'player',
+        })
+    }
+    for key, val in kwargs.items():
+        if key == 'text' or key == 'title':
+            continue
+        data[str(key)] = str(val)
+    image = data['image'] if 'image' in data else '0'
+    return PushPayload(messaging.Notification(title=title, body=message, image=image), data)
+
+
+def split_batches(tokens: list[str], batch_size: int = PUSH_BATCH_SIZE) -> list[list[str]]:
+    return [tokens[i:i + batch_size] for i in range(0, len(tokens), batch_size)]
+
+
+def send_batch(payload: PushPayload, tokens: list[str], messaging, retries: int = PUSH_BATCH_RETRIES) -> BatchResult:
+    result = BatchResult(tokens)
+    message = messaging.MulticastMessage(notification=payload.notification, tokens=tokens, data=payload.data)
+    for attempt in range(retries + 1):
+        result.attempts = attempt + 1
+        try:
+            response = messaging.send_multicast(message)
+        except Exception as e:
+            result.error = e
+            if attempt < retries:
+                time.sleep(PUSH_RETRY_DELAY * 2 ** attempt)
+        else:
+            result.responses = response.responses
+            result.success_count = response.success_count
+            result.error = None
+            break
+    return result
+
+
+def fan_out(payload: PushPayload, tokens: list[str], workers: int = PUSH_WORKERS, messaging=None,
+            batch_size: int = PUSH_BATCH_SIZE, retries: int = PUSH_BATCH_RETRIES) -> list[BatchResult]:
+    '''
+    send batches over bounded thread pool, results are in order of batches,
+    threads only talk to fcm so database work stays in caller thread
+    '''
+    messaging = messaging or get_messaging()
+    batches = split_batches(tokens, batch_size)
+    if len(batches) <= 1 or workers <= 1:
+        return [send_batch(payload, batch, messaging, retries) for batch in batches]
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+        return list(executor.map(lambda batch: send_batch(payload, batch, messaging, retries), batches))
+
+
+def failed_tokens(results: list[BatchResult]) -> list[str]:
+    return [token for result in results if result.error is not None for token in result.tokens]
+
+
+def fan_out_stats(results: list[BatchResult]) -> dict:
+    tokens = sum(len(result.tokens) for result in results)
+    success_count = sum(result.success_count for result in results)
+    return {
+        'success_count': success_count,
+        'failure_count': tokens - success_count,
+        'len_devices_tokens': tokens,
+        'batches': len(results),
+        'failed_batches': sum(result.error is not None for result in results),
+        'retries': sum(result.attempts - 1 for result in results),
+    }
@@ -0,0 +1,131 @@
+import itertools
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+from firebase_admin import messaging
+
+from united_help.settings import PUSH_BACKEND
+
+
+@dataclass
+class FakeSendResponse:
+    message_id: Optional[str] = None
+    exception: Optional[Exception] = None
+
+    @property
+    def success(self) -> bool:
+        return self.exception is None
+
+
+@dataclass
+class FakeBatchResponse:
+    responses: list[FakeSendResponse]
+
+    @property
+    def success_count(self) -> int:
+        return sum(response.success for response in self.responses)
+
+    @property
+    def failure_count(self) -> int:
+        return len(self.responses) - self.success_count
+
+
+@dataclass
+class FakeTopicError:
+    index: int
+    reason: str
+
+
+@dataclass
+class FakeTopicManagementResponse:
+    success_count: int
+    failure_count: int
+    errors: list[FakeTopicError]
+
+
+class FakeMessaging:
+    '''
+    stand-in for firebase_admin.messaging which keeps sent messages in memory,
+    tokens from unregistered_tokens are answered as dead devices and latency emulates FCM round-trip
+    '''
+    Message = messaging.Message
+    MulticastMessage = messaging.MulticastMessage
+    Notification = messaging.Notification
+    UnregisteredError = messaging.UnregisteredError
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.unregistered_tokens: set[str] = set()
+        # next calls to send or send_multicast raise this many times
+        self.failures = 0
+        self.sent: list = []
+        self.topics: dict[str, set[str]] = {}
+        self._ids = itertools.count(1)
+        self._lock = Lock()
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError('fake fcm is unavailable')
+
+    def _message_id(self) -> str:
+        with self._lock:
+            return f'projects/fake/messages/{next(self._ids)}'
+
+    def send(self, message, dry_run=False) -> str:
+        self._call()
+        self.sent.append(message)
+        return self._message_id()
+
+    def send_multicast(self, multicast_message, dry_run=False) -> FakeBatchResponse:
+        self._call()
+        self.sent.append(multicast_message)
+        responses = []
+        for token in multicast_message.tokens:
+            if token in self.unregistered_tokens:
+                responses.append(FakeSendResponse(exception=self.UnregisteredError('token is not registered')))
+            else:
+                responses.append(FakeSendResponse(message_id=self._message_id()))
+        return FakeBatchResponse(responses)
+
+    def _change_topic(self, tokens, topic: str, subscribe: bool) -> FakeTopicManagementResponse:
+        self._call()
+        tokens = [tokens] if isinstance(tokens, str) else list(tokens)
+        errors = [FakeTopicError(i, 'registration-token-not-registered')
+                  for i, token in enumerate(tokens) if token in self.unregistered_tokens]
+        failed = {error.index for error in errors}
+        with self._lock:
+            members = self.topics.setdefault(topic.removeprefix('/topics/'), set())
+            for i, token in enumerate(tokens):
+                if i not in failed:
+                    members.add(token) if subscribe else members.discard(token)
+        return FakeTopicManagementResponse(len(tokens) - len(errors), len(errors), errors)
+
+    def subscribe_to_topic(self, tokens, topic: str) -> FakeTopicManagementResponse:
+        return self._change_topic(tokens, topic, subscribe=True)
+
+    def unsubscribe_from_topic(self, tokens, topic: str) -> FakeTopicManagementResponse:
+        return self._change_topic(tokens, topic, subscribe=False)
+
+
+_messaging = None
+
+
+def get_messaging():
+    '''
+    firebase_admin.messaging or in-memory fake when PUSH_BACKEND is 'fake'
+    '''
+    global _messaging
+    if _messaging is None:
+        _messaging = FakeMessaging() if PUSH_BACKEND == 'fake' else messaging
+    return _messaging
+
+
+def set_messaging(backend):
+    global _messaging
+    _messaging = backend
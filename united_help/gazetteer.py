@@ -0,0 +1,138 @@
+import csv
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+from united_help.helpers import haversine_km
+from united_help.models import City
+
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'ua_gazetteer.csv'
+# cities could be changed by other processes, so index is rebuilt from time to time
+CITY_INDEX_TTL = 10 * 60
+
+
+@dataclass(frozen=True)
+class Settlement:
+    name: str
+    aliases: tuple[str, ...]
+    lat: float
+    lon: float
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        return (self.name, ) + self.aliases
+
+
+@lru_cache(maxsize=None)
+def load_gazetteer(path: Path = GAZETTEER_PATH) -> dict[str, Settlement]:
+    '''
+    return settlements from bundled gazetteer by every lowercase name and alias
+    '''
+    settlements = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            settlement = Settlement(
+                name=row['name'],
+                aliases=tuple(alias for alias in row['aliases'].split('|') if alias),
+                **{field: float(row[field]) for field in ('lat', 'lon', 'min_lat', 'min_lon', 'max_lat', 'max_lon')},
+            )
+            for name in settlement.names:
+                settlements.setdefault(name.lower(), settlement)
+    return settlements
+
+
+def find_settlement(city: City | str) -> Optional[Settlement]:
+    settlements = load_gazetteer()
+    names = [city] if isinstance(city, str) else [city.city, city.alias, *city.alias.split()]
+    for name in names:
+        if settlement := settlements.get(name.strip().lower()):
+            return settlement
+    return None
+
+
+def city_centroid(city: City | str) -> Optional[tuple[float, float, str]]:
+    '''
+    return (lat, lon, name) of city center without any network call
+    '''
+    if isinstance(city, City) and city.lat is not None and city.lon is not None:
+        return city.lat, city.lon, city.city
+    if settlement := find_settlement(city):
+        return settlement.lat, settlement.lon, settlement.name
+    return None
+
+
+class GridIndex:
+    '''
+    points bucketed by cells of `cell` degrees, nearest search walks rings of cells around the query
+    '''
+    def __init__(self, points: list[tuple[float, float, int]], cell: float = 1.0):
+        self.cell = cell
+        self.cells = defaultdict(list)
+        for lat, lon, key in points:
+            self.cells[self._cell(lat, lon)].append((lat, lon, key))
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def nearest(self, lat: float, lon: float) -> Optional[tuple[float, int]]:
+        if not self.cells:
+            return None
+        ci, cj = self._cell(lat, lon)
+        best = None
+        for ring in range(int(360 / self.cell)):
+            for i in range(ci - ring, ci + ring + 1):
+                for j in range(cj - ring, cj + ring + 1):
+                    if max(abs(i - ci), abs(j - cj)) != ring:
+                        continue
+                    for point_lat, point_lon, key in self.cells.get((i, j), ()):
+                        distance = haversine_km(lat, lon, point_lat, point_lon)
+                        if best is None or distance < best[0]:
+                            best = (distance, key)
+            # every point outside of walked rings is at least `ring` cells away
+            min_outside = ring * self.cell * 111.32 * math.cos(math.radians(min(abs(lat) + (ring + 1) * self.cell, 89)))
+            if best is not None and best[0] <= min_outside:
+                break
+        return best
+
+
+_city_index: Optional[GridIndex] = None
+_city_index_built = 0.0
+_city_index_lock = Lock()
+
+
+def get_city_index() -> GridIndex:
+    global _city_index, _city_index_built
+    with _city_index_lock:
+        if _city_index is None or time.monotonic() - _city_index_built > CITY_INDEX_TTL:
+            points = City.objects.filter(lat__isnull=False, lon__isnull=False).values_list('lat', 'lon', 'id')
+            _city_index = GridIndex(list(points))
+            _city_index_built = time.monotonic()
+        return _city_index
+
+
+def invalidate_city_index():
+    global _city_index
+    with _city_index_lock:
+        _city_index = None
+
+
+def nearest_city(lat: float, lon: float) -> Optional[tuple[City, float]]:
+    '''
+    return nearest city with its distance in km
+    '''
+    found = get_city_index().nearest(lat, lon)
+    if found is None:
+        return None
+    distance, city_id = found
+    city = City.objects.filter(id=city_id).first()
+    return (city, distance) if city else None
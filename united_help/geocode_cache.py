@@ -0,0 +1,113 @@
+import re
+from datetime import timedelta
+from typing import Optional
+
+from django.db import IntegrityError
+from django.utils import timezone
+
+from united_help.helpers import LRUCache, MISSING
+from united_help.models import GeocodeCache
+from united_help.settings import GEOCODE_CACHE_TTL, GEOCODE_CACHE_NEGATIVE_TTL, GEOCODE_CACHE_MAX_SIZE, \
+    GEOCODE_CACHE_LRU_SIZE, GEOCODE_CACHE_TOUCH_INTERVAL
+
+Location = tuple[float, float, str]
+
+stats = {
+    'lru_hits': 0,
+    'db_hits': 0,
+    'negative_hits': 0,
+    'misses': 0,
+    'stores': 0,
+    'evictions': 0,
+}
+
+
+_lru = LRUCache(GEOCODE_CACHE_LRU_SIZE)
+
+
+def normalize_location(location: str) -> str:
+    return ' '.join(re.sub(r'[,;"\']+', ' ', location.lower()).split())[:255]
+
+
+def make_key(city: str, location: str) -> tuple[str, str]:
+    return normalize_location(city), normalize_location(location)
+
+
+def _ttl(found: bool) -> int:
+    return GEOCODE_CACHE_TTL if found else GEOCODE_CACHE_NEGATIVE_TTL
+
+
+def get(city: str, location: str):
+    '''
+    return (lat, lon, display) if location is cached,
+    None if location is cached as not found
+    and MISSING if upstream should be asked
+    '''
+    key = make_key(city, location)
+    value = _lru.get(key)
+    if value is not MISSING:
+        stats['lru_hits'] += 1
+        if value is None:
+            stats['negative_hits'] += 1
+        return value
+
+    entry = GeocodeCache.objects.filter(city=key[0], query=key[1]).first()
+    if entry is None or entry.created < timezone.now() - timedelta(seconds=_ttl(entry.found)):
+        stats['misses'] += 1
+        return MISSING
+
+    if entry.last_used < timezone.now() - timedelta(seconds=GEOCODE_CACHE_TOUCH_INTERVAL):
+        # eviction only needs last_used roughly, so it is written at most once per interval
+        GeocodeCache.objects.filter(pk=entry.pk).update(last_used=timezone.now())
+    stats['db_hits'] += 1
+    value = (entry.lat, entry.lon, entry.display) if entry.found else None
+    if value is None:
+        stats['negative_hits'] += 1
+    _lru.set(key, value, _ttl(entry.found))
+    return value
+
+
+def put(city: str, location: str, value: Optional[Location]):
+    key = make_key(city, location)
+    found = value is not None
+    lat, lon, display = value if found else (0, 0, '')
+    now = timezone.now()
+    try:
+        GeocodeCache.objects.update_or_create(
+            city=key[0], query=key[1],
+            defaults={'found': found, 'lat': lat, 'lon': lon, 'display': display[:255],
+                      'created': now, 'last_used': now},
+        )
+    except IntegrityError:
+        # another worker stored the same location at the same moment
+        pass
+    _lru.set(key, value, _ttl(found))
+    stats['stores'] += 1
+
+
+def evict() -> int:
+    '''
+    drop expired and least recently used locations over GEOCODE_CACHE_MAX_SIZE, run by scheduler
+    '''
+    expired = GeocodeCache.objects.filter(
+        created__lt=timezone.now() - timedelta(seconds=max(GEOCODE_CACHE_TTL, GEOCODE_CACHE_NEGATIVE_TTL)))
+    evicted, _ = expired.delete()
+
+    cutoff = GeocodeCache.objects.order_by('-last_used').values_list('last_used', flat=True)[
+             GEOCODE_CACHE_MAX_SIZE:GEOCODE_CACHE_MAX_SIZE + 1]
+    if cutoff:
+        deleted, _ = GeocodeCache.objects.filter(last_used__lte=cutoff[0]).delete()
+        evicted += deleted
+    stats['evictions'] += evicted
+    return evicted
+
+
+def get_stats() -> dict:
+    lookups = stats['lru_hits'] + stats['db_hits'] + stats['misses']
+    hits = stats['lru_hits'] + stats['db_hits']
+    return {
+        **stats,
+        'hit_rate': hits / lookups if lookups else 0,
+        'lru_size': len(_lru),
+        'db_size': GeocodeCache.objects.count(),
+    }
@@ -0,0 +1,205 @@
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from united_help.counters import next_window_value
+from united_help.settings import GEOCODER_NOMINATIM_URL, GEOCODER_W3W_URL, GEOCODER_TIMEOUT, GEOCODER_DEADLINE, \
+    GEOCODER_RATE, GEOCODER_BURST, GEOCODER_FAILURE_THRESHOLD, GEOCODER_RESET_TIMEOUT, GEOCODER_POOL_SIZE
+
+
+COUNTRY_NAME = 'Украина'
+USER_AGENT = 'united-help-back'
+
+Location = tuple[float, float, str]
+
+
+class GeocoderUnavailable(Exception):
+    '''
+    upstream is not answering, is over rate limit or circuit breaker is open,
+    location should stay pending and be retried later
+    '''
+
+
+class RateLimiter:
+    '''
+    token bucket shared by all workers through counter row in database, taken by atomic update
+    so workers together stay under the limit, bucket gets `burst` tokens every burst / rate seconds
+    '''
+    def __init__(self, rate: float, burst: int, key: str = 'geocoder:tokens'):
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self.window = burst / rate
+
+    def acquire(self, deadline: float) -> bool:
+        while True:
+            now = time.time()
+            window = int(now / self.window)
+            used = next_window_value(self.key, window)
+            if used <= self.burst:
+                return True
+            next_window = (window + 1) * self.window
+            if next_window > deadline:
+                return False
+            time.sleep(next_window - now)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # thread of the one probe request half-open breaker let through, others wait for its result
+        self.probing: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.time() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        # after reset_timeout one request is let through (half-open), its result closes or reopens breaker
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.is_open or self.probing is not None:
+                return False
+            self.probing = threading.get_ident()
+            return True
+
+    def release(self):
+        '''
+        probe of this thread was not sent, next request may probe
+        '''
+        with self._lock:
+            if self.probing == threading.get_ident():
+                self.probing = None
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = None
+
+    def failure(self):
+        with self._lock:
+            self.failures = min(self.failures + 1, self.failure_threshold)
+            if self.probing == threading.get_ident() or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                self.probing = None
+
+
+class NominatimProvider:
+    def __init__(self, base_url: str = GEOCODER_NOMINATIM_URL, country: str = COUNTRY_NAME):
+        self.base_url = base_url.rstrip('/')
+        self.country = country
+
+    def search(self, client: 'GeocoderClient', city: str, string_location: str, deadline: float) -> Optional[Location]:
+        for query in (f'{self.country} {city} {string_location}', f'{self.country} {string_location}'):
+            response = client.get(f'{self.base_url}/search', deadline, params={'q': query, 'format': 'json'})
+            found = response.json() if response.ok else []
+            if found:
+                return float(found[0]['lat']), float(found[0]['lon']), found[0]['display_name']
+        return None
+
+
+class What3WordsProvider:
+    MINIMAP = 'https://mapapi.what3words.com/map/minimap?'
+
+    def __init__(self, base_url: str = GEOCODER_W3W_URL):
+        self.base_url = base_url.rstrip('/')
+
+    def search(self, client: 'GeocoderClient', three_word_location: str, deadline: float) -> Optional[Location]:
+        response = client.get(f'{self.base_url}/{three_word_location}', deadline,
+                              params={'alias': three_word_location})
+        if not response.ok:
+            return None
+        text = response.text
+        start = text.find(self.MINIMAP)
+        if start < 0:
+            return None
+        start += len(self.MINIMAP)
+        parse_text = text[start: start + 50]
+        lat = parse_text[parse_text.find('lat=') + 4: parse_text.find('&')]
+        lon_start = parse_text.find('lng=')
+        lon = parse_text[lon_start + 4: parse_text[lon_start:].find('&') + lon_start]
+        display_location_prestart = text.find('og:description') + len('og:description"')
+        display_location_start = text[display_location_prestart:].find('"') + display_location_prestart + 1
+        display_location_finish = text[display_location_start:].find('"') + display_location_start
+        try:
+            return float(lat), float(lon), text[display_location_start: display_location_finish]
+        except ValueError:
+            return None
+
+
+class GeocoderClient:
+    def __init__(self, nominatim: NominatimProvider = None, what3words: What3WordsProvider = None,
+                 timeout: float = GEOCODER_TIMEOUT, deadline: float = GEOCODER_DEADLINE,
+                 rate_limiter: RateLimiter = None, breaker: CircuitBreaker = None,
+                 pool_size: int = GEOCODER_POOL_SIZE):
+        self.nominatim = nominatim or NominatimProvider()
+        self.what3words = what3words or What3WordsProvider()
+        self.timeout = timeout
+        self.deadline = deadline
+        self.rate_limiter = rate_limiter or RateLimiter(GEOCODER_RATE, GEOCODER_BURST)
+        self.breaker = breaker or CircuitBreaker(GEOCODER_FAILURE_THRESHOLD, GEOCODER_RESET_TIMEOUT)
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url: str, deadline: float, **kwargs) -> requests.Response:
+        if not self.breaker.allow():
+            raise GeocoderUnavailable('circuit breaker is open')
+        if not self.rate_limiter.acquire(deadline):
+            self.breaker.release()
+            raise GeocoderUnavailable('rate limit is exceeded')
+        timeout = min(self.timeout, deadline - time.time())
+        if timeout <= 0:
+            self.breaker.release()
+            raise GeocoderUnavailable('deadline is exceeded')
+
+        try:
+            response = self.session.get(url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            self.breaker.failure()
+            raise GeocoderUnavailable(str(e)) from e
+        if response.status_code == 429 or response.status_code >= 500:
+            self.breaker.failure()
+            raise GeocoderUnavailable(f'{url} answered {response.status_code}')
+        self.breaker.success()
+        return response
+
+    def locate(self, city: str, string_location: str, three_word_location: str = None) -> Optional[Location]:
+        deadline = time.time() + self.deadline
+        try:
+            if three_word_location:
+                return self.what3words.search(self, three_word_location, deadline)
+            return self.nominatim.search(self, city, string_location, deadline)
+        except (ValueError, KeyError, IndexError):
+            # upstream answered with something we can not parse
+            return None
+
+
+_geocoder: Optional[GeocoderClient] = None
+
+
+def get_geocoder() -> GeocoderClient:
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = GeocoderClient()
+    return _geocoder
+
+
+def set_geocoder(geocoder: Optional[GeocoderClient]):
+    '''
+    swap geocoder, e.g. for client pointed to local fake nominatim/w3w server
+    '''
+    global _geocoder
+    _geocoder = geocoder
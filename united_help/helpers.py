@@ -1,4 +1,12 @@
-from typing import Optional
+import json
+import math
+import time
+from collections import defaultdict, deque, OrderedDict
+from threading import Lock
+from typing import Optional, Iterable
+
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, QuerySet
 
 
 def str_to_bool(string: str) -> Optional[bool]:
@@ -25,4 +33,140 @@ def index_in_list(list_: list[str], search: str) -> int:
         return -1
 
 
-DATETIME_FORMAT = '%d_%m_%Y-%H_%M_%S'
\ No newline at end of file
+def order_by_ids(queryset: QuerySet, ids: list[int]) -> QuerySet:
+    '''
+    filter queryset by ids keeping order of ids
+    '''
+    if not ids:
+        return queryset.none()
+    ordering = Case(*[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).order_by(ordering)
+
+
+
+def filter_by_ids(queryset: QuerySet, ids: list[int]) -> QuerySet:
+    '''
+    filter queryset by ids bound as one parameter, so long lists do not exceed limit of query variables
+    '''
+    if not ids:
+        return queryset.none()
+    column = f'"{queryset.model._meta.db_table}"."{queryset.model._meta.pk.column}"'
+    if connection.vendor == 'sqlite':
+        return queryset.extra(where=[f'{column} IN (SELECT value FROM json_each(%s))'], params=[json.dumps(ids)])
+    if connection.vendor == 'postgresql':
+        return queryset.extra(where=[f'{column} = ANY(%s)'], params=[list(ids)])
+    return queryset.filter(pk__in=ids)
+
+
+DATETIME_FORMAT = '%d_%m_%Y-%H_%M_%S'
+
+# returned by LRUCache.get() when there is nothing in cache, so None could be cached
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return MISSING
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: int):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            return self._items.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+# character which is greater than any geohash character, [prefix, prefix + GEOHASH_END) is range of prefix
+GEOHASH_END = '{'
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, range_ = (lon, lon_range) if even else (lat, lat_range)
+        middle = (range_[0] + range_[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            range_[0] = middle
+        else:
+            range_[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def geohash_cell_size(precision: int) -> tuple[float, float]:
+    '''
+    return (lat, lon) size of geohash cell in degrees
+    '''
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def closure_rows(skill_ids: Iterable[int], edges: Iterable[tuple[int, int]]) -> dict[tuple[int, int], int]:
+    '''
+    return {(ancestor, descendant): shortest depth} for skills by (child, parent) edges
+    '''
+    parents = defaultdict(list)
+    for child, parent in edges:
+        parents[child].append(parent)
+    rows = {}
+    for skill_id in skill_ids:
+        depths = {skill_id: 0}
+        queue = deque([skill_id])
+        while queue:
+            current = queue.popleft()
+            for parent in parents[current]:
+                if parent not in depths:
+                    depths[parent] = depths[current] + 1
+                    queue.append(parent)
+        for ancestor, depth in depths.items():
+            rows[(ancestor, skill_id)] = depth
+    return rows
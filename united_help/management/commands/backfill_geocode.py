@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from united_help.models import Event
+from united_help.settings import GEOCODE_BATCH_SIZE
+from united_help.tasks import geocode_pending_page
+
+
+class Command(BaseCommand):
+    help = 'Put every event which is still at 0/0 into geocode queue and resolve it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=GEOCODE_BATCH_SIZE)
+        parser.add_argument('--enqueue-only', action='store_true',
+                            help='only mark events as pending and leave them to scheduler')
+
+    def handle(self, *args, **options):
+        queued = Event.objects.filter(Q(location_lat=0) | Q(location_lon=0)).update(geocode_pending=True)
+        self.stdout.write(f'{queued} events are waiting for geocoding')
+        if options['enqueue_only']:
+            return
+
+        # paged by id, so events which fail every time do not stop the rest
+        resolved, last_id = 0, 0
+        while True:
+            page_resolved, last_id = geocode_pending_page(last_id, options['batch_size'])
+            if last_id is None:
+                break
+            resolved += page_resolved
+        left = Event.objects.filter(geocode_pending=True).count()
+        self.stdout.write(self.style.SUCCESS(f'{resolved} events resolved, {left} left pending'))
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from united_help.models import City, Event, EventLog, Profile, User
+from united_help.views import EventsAttendedView, EventsFinishedView
+
+
+class Command(BaseCommand):
+    help = 'Measure attended and finished events latency while event logs grow, everything is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='event log rows to measure at')
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--attended-every', type=int, default=10,
+                            help='volunteer attended every n-th event')
+
+    def grow(self, city, organizer, volunteer, start: int, stop: int, attended_every: int):
+        for offset in range(start, stop, 1000):
+            count = min(1000, stop - offset)
+            events = Event.objects.bulk_create([
+                Event(name=f'Benchmark {offset + i}', description='benchmark', city=city, location='benchmark',
+                      employment=Event.Employments.one_time, owner=organizer, required_members=10,
+                      image='user_images/benchmark.png', active=False)
+                for i in range(count)
+            ])
+            logs = EventLog.objects.bulk_create([EventLog(event=event, happened=True) for event in events])
+            Attended = EventLog.volunteers_attended.through
+            Attended.objects.bulk_create([
+                Attended(eventlog_id=log.id, profile_id=volunteer.id)
+                for i, log in enumerate(logs, offset) if i % attended_every == 0
+            ])
+
+    def measure(self, view, user, params: dict, repeat: int) -> float:
+        factory = APIRequestFactory()
+        started = time.monotonic()
+        for _ in range(repeat):
+            request = factory.get('/', params)
+            force_authenticate(request, user=user)
+            response = view(request)
+            response.render()
+            assert response.status_code == 200, response.status_code
+        return (time.monotonic() - started) / repeat * 1000
+
+    def handle(self, *args, **options):
+        suffix = time.time_ns()
+        attended, finished = EventsAttendedView.as_view(), EventsFinishedView.as_view()
+        with transaction.atomic():
+            city = City.objects.create(city='Benchmark', alias='benchmark')
+            organizer = Profile.objects.create(
+                user=User.objects.create_user(username=f'benchmark-organizer-{suffix}'),
+                role=Profile.Roles.organizer)
+            volunteer = Profile.objects.create(
+                user=User.objects.create_user(username=f'benchmark-volunteer-{suffix}'),
+                role=Profile.Roles.volunteer)
+            rows = 0
+            for size in sorted(options['sizes']):
+                self.grow(city, organizer, volunteer, rows, size, options['attended_every'])
+                rows = size
+                results = []
+                for name, view, user in (('attended', attended, volunteer.user),
+                                         ('finished', finished, organizer.user)):
+                    offset = self.measure(view, user, {'limit': 20}, options['repeat'])
+                    cursor = self.measure(view, user, {'limit': 20, 'pagination': 'cursor'}, options['repeat'])
+                    results.append(f'{name} {offset:.1f}ms offset, {cursor:.1f}ms cursor')
+                self.stdout.write(f'{size:>7} event logs: ' + '; '.join(results))
+            transaction.set_rollback(True)
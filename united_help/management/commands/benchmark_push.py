@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from united_help.fanout import build_payload, fan_out, fan_out_stats
+from united_help.fcm import FakeMessaging
+
+
+class Command(BaseCommand):
+    help = 'Measure multicast fan-out throughput against in-memory fake FCM for several worker counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=100000)
+        parser.add_argument('--latency', type=float, default=0.2, help='seconds of one fake FCM call')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+
+    def handle(self, *args, **options):
+        tokens = [f'fake-token-{i}' for i in range(options['tokens'])]
+        for workers in options['workers']:
+            messaging = FakeMessaging(latency=options['latency'])
+            payload = build_payload('Benchmark', 'Fan-out benchmark', messaging=messaging, notify_type='change')
+            started = time.monotonic()
+            stats = fan_out_stats(fan_out(payload, tokens, workers=workers, messaging=messaging))
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{workers:>3} workers: {stats["batches"]} batches in {elapsed:.2f}s, '
+                              f'{stats["success_count"] / elapsed:.0f} messages/s')
@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from united_help.models import City, Event, Profile, User
+from united_help.search import LikeSearchBackend, SqliteFtsSearchBackend, fts_available
+
+WORDS = ('food', 'medicine', 'shelter', 'transport', 'children', 'clothes', 'water', 'repair', 'evacuation',
+         'language', 'psychology', 'animals', 'kitchen', 'warehouse', 'generator', 'blood', 'donor', 'school')
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text and LIKE event search on synthetic events, everything is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000)
+        parser.add_argument('--queries', nargs='+', default=['food', 'medic', 'blood donor', 'evacuation children'])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=20, help='events on one page')
+
+    def measure(self, backend, queryset, query: str, repeat: int, limit: int) -> tuple[float, int]:
+        started = time.monotonic()
+        for _ in range(repeat):
+            page = list(backend.search(queryset, query)[:limit])
+        return (time.monotonic() - started) / repeat * 1000, len(page)
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stderr.write('full-text index table is missing, run migrations first')
+            return
+        rng = random.Random(0)
+        with transaction.atomic():
+            city = City.objects.create(city='Benchmark', alias='benchmark')
+            other_city = City.objects.create(city='Benchmark other', alias='benchmark other')
+            user = User.objects.create(username=f'benchmark-search-{time.time_ns()}')
+            owner = Profile.objects.create(user=user, role=Profile.Roles.organizer)
+            Event.objects.bulk_create([
+                Event(
+                    name=' '.join(rng.sample(WORDS, 3)),
+                    description=' '.join(rng.choices(WORDS, k=30)),
+                    # most events are in other city, so filtered search has few matches among many
+                    city=city if i % 100 == 0 else other_city,
+                    location='benchmark',
+                    employment=Event.Employments.one_time,
+                    owner=owner,
+                    required_members=10,
+                    active=i % 3 != 0,
+                ) for i in range(options['events'])
+            ], batch_size=1000)
+            SqliteFtsSearchBackend().rebuild()
+            self.stdout.write(f'{options["events"]} events indexed')
+
+            querysets = {
+                'all': Event.objects.all(),
+                'city+active': Event.objects.filter(city=city, active=True),
+            }
+            for query in options['queries']:
+                for filters, queryset in querysets.items():
+                    results = []
+                    for backend in (LikeSearchBackend(), SqliteFtsSearchBackend()):
+                        elapsed, found = self.measure(backend, queryset, query, options['repeat'], options['limit'])
+                        results.append(f'{type(backend).__name__} {elapsed:.1f}ms ({found})')
+                    self.stdout.write(f'{query!r:>24} {filters:>12}: ' + ', '.join(results))
+            # fts table is in the same database, so its rows are rolled back with events
+            transaction.set_rollback(True)
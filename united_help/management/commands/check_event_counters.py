@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from united_help.counters import check_event_counters
+
+
+class Command(BaseCommand):
+    help = 'Compare participants and comments counters of events with real rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='recount events with wrong counters')
+
+    def handle(self, *args, **options):
+        drifted = check_event_counters(fix=options['fix'])
+        for event_id, participants_count, participants, comments_count, comments in drifted:
+            self.stdout.write(f'Event_{event_id}: participants {participants_count} should be {participants}, '
+                              f'comments {comments_count} should be {comments}')
+        action = 'fixed' if options['fix'] else 'found'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} events with wrong counters {action}'))
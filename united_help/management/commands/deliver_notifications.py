@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from united_help.outbox import deliver_outbox
+from united_help.settings import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL
+
+
+class Command(BaseCommand):
+    help = 'Send push notifications waiting in outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument('--forever', action='store_true',
+                            help=f'keep polling outbox every {OUTBOX_POLL_INTERVAL} seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = 0
+            while batch_sent := deliver_outbox(options['batch_size']):
+                sent += batch_sent
+            if sent:
+                self.stdout.write(self.style.SUCCESS(f'{sent} notifications sent'))
+            if not options['forever']:
+                break
+            time.sleep(OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from united_help.gazetteer import load_gazetteer, find_settlement, invalidate_city_index
+from united_help.models import City
+
+
+class Command(BaseCommand):
+    help = 'Fill city centroids and bounding boxes from bundled gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--create', action='store_true',
+                            help='also create cities which are in gazetteer but not in database')
+
+    def handle(self, *args, **options):
+        updated = 0
+        known = set()
+        for city in City.objects.all():
+            settlement = find_settlement(city)
+            if settlement is None:
+                self.stdout.write(self.style.WARNING(f'{city} is not in gazetteer'))
+                continue
+            known.add(settlement.name)
+            City.objects.filter(pk=city.pk).update(
+                lat=settlement.lat, lon=settlement.lon,
+                min_lat=settlement.min_lat, min_lon=settlement.min_lon,
+                max_lat=settlement.max_lat, max_lon=settlement.max_lon,
+            )
+            updated += 1
+
+        created = 0
+        if options['create']:
+            settlements = {settlement.name: settlement for settlement in load_gazetteer().values()}
+            for name, settlement in settlements.items():
+                if name in known:
+                    continue
+                City.objects.create(
+                    city=settlement.name, alias=' '.join(settlement.names),
+                    lat=settlement.lat, lon=settlement.lon,
+                    min_lat=settlement.min_lat, min_lon=settlement.min_lon,
+                    max_lat=settlement.max_lat, max_lon=settlement.max_lon,
+                )
+                created += 1
+        invalidate_city_index()
+        self.stdout.write(self.style.SUCCESS(f'{updated} cities updated, {created} created'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from united_help.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text index of event names and descriptions'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        indexed = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{indexed} events indexed by {type(backend).__name__}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from united_help.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute vote count, score sum and rating of profiles from votes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='only report profiles which drifted')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_ratings(fix=not options['dry_run'])
+        for profile, vote_count, score_sum in drifted:
+            self.stdout.write(f'{profile}: {profile.vote_count}/{profile.score_sum} '
+                              f'should be {vote_count}/{score_sum}')
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} profiles {action}'))
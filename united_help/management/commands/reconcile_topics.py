@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from united_help.topics import reconcile_topics
+
+
+class Command(BaseCommand):
+    help = 'Subscribe device tokens to fcm topics of organizers their users follow and drop stale subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='only count wrong subscriptions')
+
+    def handle(self, *args, **options):
+        missing, stale = reconcile_topics(fix=not options['dry_run'])
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{missing} missing and {stale} stale topic subscriptions {action}'))
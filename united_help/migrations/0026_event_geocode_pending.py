@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2023-02-12 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0025_alter_user_facebook_token_alter_user_firebase_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='geocode_pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
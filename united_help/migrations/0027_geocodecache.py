@@ -0,0 +1,30 @@
+# Generated by Django 4.1.3 on 2023-02-13 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0026_event_geocode_pending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=255)),
+                ('query', models.CharField(max_length=255)),
+                ('found', models.BooleanField(default=True)),
+                ('lat', models.FloatField(default=0)),
+                ('lon', models.FloatField(default=0)),
+                ('display', models.CharField(blank=True, default='', max_length=255)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'unique_together': {('city', 'query')},
+            },
+        ),
+    ]
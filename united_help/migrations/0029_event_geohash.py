@@ -0,0 +1,27 @@
+# Generated by Django 4.1.3 on 2023-02-18 16:31
+
+from django.db import migrations, models
+
+from united_help.helpers import geohash_encode
+
+
+def fill_geohash(apps, schema_editor):
+    Event = apps.get_model('united_help', 'Event')
+    for event in Event.objects.exclude(location_lat=0, location_lon=0).only('id', 'location_lat', 'location_lon'):
+        Event.objects.filter(pk=event.pk).update(geohash=geohash_encode(event.location_lat, event.location_lon))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0028_city_lat_city_lon_city_max_lat_city_max_lon_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1.3 on 2023-02-21 10:12
+
+from django.db import migrations
+
+
+FTS_TABLE = 'united_help_event_fts'
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, name, description) SELECT id, name, description FROM united_help_event'
+    )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0029_event_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.1.3 on 2023-02-24 13:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from united_help.helpers import closure_rows
+
+
+def build_closure(apps, schema_editor):
+    Skill = apps.get_model('united_help', 'Skill')
+    SkillClosure = apps.get_model('united_help', 'SkillClosure')
+    Through = Skill.parents.through
+
+    # parents were symmetrical, so every link is stored in both directions,
+    # parent is supposed to be created before its children and keeps the smaller id
+    edges = set(Through.objects.values_list('from_skill_id', 'to_skill_id'))
+    for child, parent in edges:
+        if (parent, child) in edges and child < parent:
+            Through.objects.filter(from_skill_id=child, to_skill_id=parent).delete()
+
+    edges = Through.objects.values_list('from_skill_id', 'to_skill_id')
+    rows = closure_rows(Skill.objects.values_list('id', flat=True), edges)
+    SkillClosure.objects.bulk_create(
+        [SkillClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+         for (ancestor, descendant), depth in rows.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0030_event_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='skill',
+            name='parents',
+            field=models.ManyToManyField(blank=True, related_name='children', to='united_help.skill'),
+        ),
+        migrations.CreateModel(
+            name='SkillClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='united_help.skill')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='united_help.skill')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
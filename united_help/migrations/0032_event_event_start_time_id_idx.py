@@ -0,0 +1,17 @@
+# Generated by Django 4.1.3 on 2023-02-27 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0031_skillclosure_alter_skill_parents'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_time', 'id'], name='event_start_time_id_idx'),
+        ),
+    ]
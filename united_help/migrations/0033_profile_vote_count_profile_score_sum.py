@@ -0,0 +1,34 @@
+# Generated by Django 4.1.3 on 2023-02-28 10:14
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_ratings(apps, schema_editor):
+    Profile = apps.get_model('united_help', 'Profile')
+    Voting = apps.get_model('united_help', 'Voting')
+    Profile.objects.update(vote_count=0, score_sum=0, rating=0)
+    for row in Voting.objects.values('applicant_id').annotate(count=Count('id'), total=Sum('score')):
+        Profile.objects.filter(pk=row['applicant_id']).update(
+            vote_count=row['count'], score_sum=row['total'], rating=row['total'] / row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0032_event_event_start_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='vote_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='score_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
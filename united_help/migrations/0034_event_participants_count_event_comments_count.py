@@ -0,0 +1,39 @@
+# Generated by Django 4.1.3 on 2023-02-28 17:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Event = apps.get_model('united_help', 'Event')
+    Comment = apps.get_model('united_help', 'Comment')
+    Participation = Event.participants.through
+
+    def count(model):
+        counts = model.objects.filter(event_id=OuterRef('pk')).order_by().values('event_id').annotate(
+            count=Count('*'))
+        return Coalesce(Subquery(counts.values('count')), 0)
+
+    Event.objects.update(participants_count=count(Participation), comments_count=count(Comment))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0033_profile_vote_count_profile_score_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='participants_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.3 on 2023-03-01 11:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0034_event_participants_count_event_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='waitlist_seq',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='united_help.event')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='united_help.profile')),
+            ],
+            options={
+                'unique_together': {('event', 'profile')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['event', 'position'], name='waitlist_event_position_idx'),
+        ),
+    ]
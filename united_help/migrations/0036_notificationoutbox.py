@@ -0,0 +1,33 @@
+# Generated by Django 4.1.3 on 2023-03-02 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0035_event_waitlist_seq_waitlistentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.TextField()),
+                ('message', models.TextField()),
+                ('user_ids', models.JSONField(blank=True, default=list)),
+                ('broadcast', models.BooleanField(default=False)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Sending'), (2, 'Sent'), (3, 'Failed')], default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt'], name='outbox_status_next_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.3 on 2023-03-03 09:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def copy_tokens(apps, schema_editor):
+    User = apps.get_model('united_help', 'User')
+    DeviceToken = apps.get_model('united_help', 'DeviceToken')
+    now = timezone.now()
+    devices = {}
+    for user_id, firebase_tokens in User.objects.exclude(firebase_tokens='').values_list('pk', 'firebase_tokens'):
+        for token in firebase_tokens.split():
+            # token registered by several users belongs to the last one
+            devices[token] = DeviceToken(user_id=user_id, token=token, last_seen=now)
+    DeviceToken.objects.bulk_create(devices.values(), batch_size=1000)
+
+
+def copy_tokens_back(apps, schema_editor):
+    User = apps.get_model('united_help', 'User')
+    DeviceToken = apps.get_model('united_help', 'DeviceToken')
+    tokens = {}
+    for user_id, token in DeviceToken.objects.order_by('id').values_list('user_id', 'token'):
+        tokens.setdefault(user_id, []).append(token)
+    for user_id, user_tokens in tokens.items():
+        User.objects.filter(pk=user_id).update(firebase_tokens=' '.join(user_tokens))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0036_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=512, unique=True)),
+                ('platform', models.CharField(blank=True, choices=[('android', 'Android'), ('ios', 'Ios'), ('web', 'Web')], default='', max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(db_index=True)),
+                ('failure_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_tokens', to='united_help.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'failure_count'], name='device_token_user_failures_idx')],
+            },
+        ),
+        migrations.RunPython(copy_tokens, copy_tokens_back),
+        migrations.RemoveField(
+            model_name='user',
+            name='firebase_tokens',
+        ),
+    ]
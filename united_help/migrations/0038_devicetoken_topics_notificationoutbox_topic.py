@@ -0,0 +1,23 @@
+# Generated by Django 4.1.3 on 2023-03-05 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0037_devicetoken_remove_user_firebase_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicetoken',
+            name='topics',
+            field=models.ManyToManyField(blank=True, related_name='topic_devices', to='united_help.profile'),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='topic',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
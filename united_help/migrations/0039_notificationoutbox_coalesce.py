@@ -0,0 +1,32 @@
+# Generated by Django 4.1.3 on 2023-03-06 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0038_devicetoken_topics_notificationoutbox_topic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='coalesce_key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='coalesce_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='merged',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(fields=['coalesce_key', 'status'], name='outbox_coalesce_key_idx'),
+        ),
+    ]
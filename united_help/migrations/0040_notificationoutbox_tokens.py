@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2023-03-07 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0039_notificationoutbox_coalesce'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='tokens',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
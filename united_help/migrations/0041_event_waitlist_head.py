@@ -0,0 +1,31 @@
+# Generated by Django 4.1.3 on 2023-03-07 15:30
+
+from django.db import migrations, models
+
+
+def renumber_waitlists(apps, schema_editor):
+    Event = apps.get_model('united_help', 'Event')
+    WaitlistEntry = apps.get_model('united_help', 'WaitlistEntry')
+    event_ids = WaitlistEntry.objects.values_list('event_id', flat=True).distinct()
+    for event_id in event_ids:
+        entries = list(WaitlistEntry.objects.filter(event_id=event_id).order_by('position', 'id'))
+        for position, entry in enumerate(entries, 1):
+            entry.position = position
+        WaitlistEntry.objects.bulk_update(entries, ['position'])
+        Event.objects.filter(pk=event_id).update(waitlist_seq=len(entries), waitlist_head=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0040_notificationoutbox_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='waitlist_head',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(renumber_waitlists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2023-03-08 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0041_event_waitlist_head'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicetoken',
+            name='topics_dirty',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
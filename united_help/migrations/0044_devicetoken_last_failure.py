@@ -0,0 +1,25 @@
+# Generated by Django 4.1.3 on 2023-03-09 11:02
+
+from django.db import migrations, models
+
+
+def reset_failures(apps, schema_editor):
+    # old counts include unavailable and internal fcm errors, which are not counted any more
+    DeviceToken = apps.get_model('united_help', 'DeviceToken')
+    DeviceToken.objects.filter(failure_count__gt=0).update(failure_count=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('united_help', '0043_sharedcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicetoken',
+            name='last_failure',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(reset_failures, migrations.RunPython.noop),
+    ]
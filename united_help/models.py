@@ -2,6 +2,8 @@ from django.db import models
 from phonenumber_field.modelfields import PhoneNumberField
 from django.contrib.auth.models import User as DjangoUser
 
+from united_help.helpers import geohash_encode
+
 
 class User(DjangoUser):
     # name = models.CharField(max_length=255)
@@ -11,7 +13,6 @@ class User(DjangoUser):
     telegram_phone = PhoneNumberField(null=True, blank=True, unique=False)
     viber_phone = PhoneNumberField(null=True, blank=True, unique=False)
     reg_date = models.DateTimeField(auto_now_add=True)
-    firebase_tokens = models.TextField(default='', blank=True)
     facebook_token = models.TextField(default='', blank=True)
     following = models.ManyToManyField('Profile', related_name='following', blank=True)
 
@@ -22,6 +23,39 @@ class User(DjangoUser):
         return repr(self)
 
 
+class DeviceToken(models.Model):
+    # firebase registration token of one device of user
+
+    class Platforms(models.TextChoices):
+        android = 'android'
+        ios = 'ios'
+        web = 'web'
+
+    user = models.ForeignKey('User', related_name='device_tokens', on_delete=models.CASCADE)
+    token = models.CharField(max_length=512, unique=True)
+    platform = models.CharField(max_length=16, choices=Platforms.choices, default='', blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(db_index=True)
+    # failed sends in a row, tokens over DEVICE_TOKEN_MAX_FAILURES are used once per DEVICE_TOKEN_RETRY_AFTER
+    failure_count = models.IntegerField(default=0)
+    last_failure = models.DateTimeField(null=True, blank=True)
+    # organizer profiles whose fcm topic this token is subscribed to, see topics.py
+    topics = models.ManyToManyField('Profile', related_name='topic_devices', blank=True)
+    # topic call of this token failed, sync_dirty_tokens subscribes it again
+    topics_dirty = models.BooleanField(default=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'failure_count'], name='device_token_user_failures_idx'),
+        ]
+
+    def __repr__(self):
+        return f'DeviceToken_{self.pk} {self.user_id} {self.platform}'
+
+    def __str__(self):
+        return repr(self)
+
+
 class Profile(models.Model):
 
     class Roles(models.IntegerChoices):
@@ -32,7 +66,10 @@ class Profile(models.Model):
 
     user = models.ForeignKey('User', verbose_name='User', on_delete=models.CASCADE)
     role = models.IntegerField(choices=Roles.choices)
+    # rating is score_sum / vote_count, all three are updated together by votes
     rating = models.FloatField(default=0)
+    vote_count = models.IntegerField(default=0)
+    score_sum = models.IntegerField(default=0)
     active = models.BooleanField(default=True)
     image = models.ImageField(upload_to='user_images/', null=True, blank=True,)
     skills = models.ManyToManyField('Skill', related_name='user_skills', blank=True)
@@ -40,6 +77,19 @@ class Profile(models.Model):
     url = models.TextField(null=True, blank=True,)
     organization = models.TextField(null=True, blank=True,)
 
+    COUNTER_FIELDS = ('rating', 'vote_count', 'score_sum')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not args and not self._state.adding and not kwargs.get('force_insert'):
+            # rating is changed by F() updates of votes only, stale values of this instance must not overwrite it
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     def __repr__(self):
         return f'<Profile: {self.user} {self.role}>'
 
@@ -50,6 +100,12 @@ class Profile(models.Model):
 class City(models.Model):
     city = models.CharField(max_length=255)
     alias = models.TextField()
+    lat = models.FloatField(null=True, blank=True)
+    lon = models.FloatField(null=True, blank=True)
+    min_lat = models.FloatField(null=True, blank=True)
+    min_lon = models.FloatField(null=True, blank=True)
+    max_lat = models.FloatField(null=True, blank=True)
+    max_lon = models.FloatField(null=True, blank=True)
 
     def __repr__(self):
         return f'City {self.city}'
@@ -58,6 +114,26 @@ class City(models.Model):
         return repr(self)
 
 
+class GeocodeCache(models.Model):
+    city = models.CharField(max_length=255)
+    query = models.CharField(max_length=255)
+    found = models.BooleanField(default=True)
+    lat = models.FloatField(default=0)
+    lon = models.FloatField(default=0)
+    display = models.CharField(max_length=255, default='', blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('city', 'query')
+
+    def __repr__(self):
+        return f'GeocodeCache {self.city} {self.query}'
+
+    def __str__(self):
+        return repr(self)
+
+
 class Event(models.Model):
 
     class Employments(models.IntegerChoices):
@@ -81,14 +157,57 @@ class Event(models.Model):
     location_lat = models.FloatField(default=0, blank=True)
     location_lon = models.FloatField(default=0, blank=True)
     location_display = models.CharField(max_length=255, default='', blank=True)
+    geocode_pending = models.BooleanField(default=False, db_index=True)
+    geohash = models.CharField(max_length=12, default='', blank=True, db_index=True)
     employment = models.IntegerField(choices=Employments.choices)
     owner = models.ForeignKey('Profile', verbose_name='Owner', on_delete=models.CASCADE)
     to = models.IntegerField(choices=Roles.choices, default=Roles.volunteer)
     participants = models.ManyToManyField('Profile', related_name='user_profiles', blank=True)
     skills = models.ManyToManyField('Skill', related_name='required_skills', blank=True)
     required_members = models.IntegerField()
+    # denormalized counts of participants and comments, kept by signals, see counters.py
+    participants_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    # waitlist positions are dense, waitlist_head entries were taken from its head and waitlist_seq is the last one
+    waitlist_seq = models.IntegerField(default=0)
+    waitlist_head = models.IntegerField(default=0)
     # TODO user can subscribe to organizer profile
 
+    COUNTER_FIELDS = ('participants_count', 'comments_count', 'waitlist_seq', 'waitlist_head')
+
+    class Meta:
+        indexes = [
+            # keyset pagination of events feed
+            models.Index(fields=['start_time', 'id'], name='event_start_time_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # geohash which is stored in database, its map tiles are dropped when event changes
+        instance.loaded_geohash = instance.__dict__.get('geohash', '')
+        return instance
+
+    @staticmethod
+    def make_geohash(lat, lon) -> str:
+        if not lat and not lon:
+            return ''
+        return geohash_encode(float(lat), float(lon))
+
+    def save(self, *args, **kwargs):
+        self.geohash = self.make_geohash(self.location_lat, self.location_lon)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not args and not self._state.adding and not kwargs.get('force_insert'):
+            # counters are changed by F() updates only, stale values of this instance must not overwrite them
+            deferred = self.get_deferred_fields()
+            update_fields = kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS and field.attname not in deferred
+            ]
+        if update_fields is not None and {'location_lat', 'location_lon'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     def __repr__(self):
         return f'Event_{self.id} {self.name}'
 
@@ -102,6 +221,13 @@ class Voting(models.Model):
     event = models.ForeignKey('Event', verbose_name='Event', on_delete=models.CASCADE,)
     score = models.IntegerField(default=0)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # vote as it is counted in applicant rating
+        instance.loaded_vote = (instance.__dict__.get('applicant_id'), instance.__dict__.get('score'))
+        return instance
+
     def __repr__(self):
         return f'<Vote: {self.voter} to {self.applicant} in {self.event} {self.score}>'
 
@@ -113,7 +239,7 @@ class Voting(models.Model):
 class Skill(models.Model):
     name = models.CharField(max_length=255)
     # description = models.TextField()
-    parents = models.ManyToManyField('self', blank=True)
+    parents = models.ManyToManyField('self', symmetrical=False, related_name='children', blank=True)
     image = models.ImageField(upload_to='user_images/', null=True, blank=True,)
 
     def __repr__(self):
@@ -124,6 +250,22 @@ class Skill(models.Model):
 
 
 
+class SkillClosure(models.Model):
+    # every path of skill hierarchy, skill is its own ancestor with depth 0
+    ancestor = models.ForeignKey('Skill', related_name='descendant_links', on_delete=models.CASCADE)
+    descendant = models.ForeignKey('Skill', related_name='ancestor_links', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+
+    def __repr__(self):
+        return f'SkillClosure {self.ancestor_id} -> {self.descendant_id} {self.depth}'
+
+    def __str__(self):
+        return repr(self)
+
+
 class EventLog(models.Model):
     event = models.ForeignKey('Event', on_delete=models.CASCADE)
     volunteers_subscribed = models.ManyToManyField('Profile', related_name='profiles_subscribed', blank=True)
@@ -138,6 +280,82 @@ class EventLog(models.Model):
         return repr(self)
 
 
+class WaitlistEntry(models.Model):
+    # volunteers waiting for free place of full event, the lowest position is promoted first
+    event = models.ForeignKey('Event', on_delete=models.CASCADE)
+    profile = models.ForeignKey('Profile', on_delete=models.CASCADE)
+    position = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('event', 'profile')
+        indexes = [
+            models.Index(fields=['event', 'position'], name='waitlist_event_position_idx'),
+        ]
+
+    def __repr__(self):
+        return f'WaitlistEntry {self.event_id} {self.profile_id} {self.position}'
+
+    def __str__(self):
+        return repr(self)
+
+
+class NotificationOutbox(models.Model):
+    # push notification waiting for delivery, written in transaction of the change it is about
+
+    class Statuses(models.IntegerChoices):
+        pending = 0
+        sending = 1
+        sent = 2
+        failed = 3
+
+    title = models.TextField()
+    message = models.TextField()
+    # ids of recipient users, ignored when broadcast to all users
+    user_ids = models.JSONField(default=list, blank=True)
+    broadcast = models.BooleanField(default=False)
+    # fcm topic, when set notification is sent once to topic instead of user tokens
+    topic = models.CharField(max_length=255, default='', blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    # device tokens which did not get the push yet, set after partial delivery so retry skips delivered ones
+    tokens = models.JSONField(default=list, blank=True)
+    # notifications with the same key are merged while this one waits for its window, see coalescing.py
+    coalesce_key = models.CharField(max_length=255, default='', blank=True)
+    coalesce_state = models.JSONField(default=dict, blank=True)
+    # how many notifications are merged into this one
+    merged = models.IntegerField(default=1)
+    status = models.IntegerField(choices=Statuses.choices, default=Statuses.pending)
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField()
+    last_error = models.TextField(default='', blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'], name='outbox_status_next_idx'),
+            models.Index(fields=['coalesce_key', 'status'], name='outbox_coalesce_key_idx'),
+        ]
+
+    def __repr__(self):
+        return f'NotificationOutbox_{self.id} {self.title}'
+
+    def __str__(self):
+        return repr(self)
+
+
+class SharedCounter(models.Model):
+    # number shared by workers, taken by one UPDATE ... RETURNING so two workers never get the same value
+    name = models.CharField(max_length=255, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __repr__(self):
+        return f'SharedCounter {self.name} {self.value}'
+
+    def __str__(self):
+        return repr(self)
+
+
 class Comment(models.Model):
     event = models.ForeignKey('Event', verbose_name='Event', on_delete=models.CASCADE)
     user = models.ForeignKey('User', verbose_name='User', on_delete=models.CASCADE)
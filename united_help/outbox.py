@@ -0,0 +1,160 @@
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from united_help.coalescing import COALESCERS
+from united_help.fanout import PartialDelivery
+from united_help.models import NotificationOutbox
+from united_help.services import send_firebase_multiple_messages, send_topic_push
+from united_help.settings import OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY, OUTBOX_MAX_RETRY_DELAY, \
+    OUTBOX_LEASE, NOTIFICATION_COALESCE_WINDOW
+
+Statuses = NotificationOutbox.Statuses
+
+
+def _user_ids(users) -> list[int]:
+    return list(dict.fromkeys(user if isinstance(user, int) else user.pk for user in users))
+
+
+def enqueue_notification(title: str, message: str, users, **kwargs) -> NotificationOutbox:
+    '''
+    takes the same arguments as send_firebase_multiple_messages, users are 'all', users or their ids,
+    row belongs to current transaction so push is sent only if the change is committed
+    '''
+    broadcast = users == 'all'
+    user_ids = [] if broadcast else _user_ids(users)
+    return NotificationOutbox.objects.create(
+        title=str(title),
+        message=str(message),
+        user_ids=user_ids,
+        broadcast=broadcast,
+        data={str(key): str(value) for key, value in kwargs.items()},
+        next_attempt=timezone.now(),
+    )
+
+
+def enqueue_coalesced(kind: str, event_id: int, users, state: dict, **kwargs) -> NotificationOutbox:
+    '''
+    notification of kind about event waits NOTIFICATION_COALESCE_WINDOW seconds in outbox,
+    next ones of the same kind and event are merged into it: states are merged by kind from COALESCERS,
+    recipients are joined, title and message are rendered again
+    '''
+    merge, render, actor_keys = COALESCERS[kind]
+    coalesce_key = f'{kind}:{event_id}'
+    user_ids = _user_ids(users)
+    data = {str(key): str(value) for key, value in kwargs.items()}
+    now = timezone.now()
+    # rows waiting for retry are not merged into, their retry may go only to remaining tokens
+    pending = NotificationOutbox.objects.filter(
+        coalesce_key=coalesce_key, status=Statuses.pending, attempts=0, next_attempt__gt=now)
+    if NOTIFICATION_COALESCE_WINDOW and (notification := pending.order_by('-id').first()) is not None:
+        merged_state = merge(notification.coalesce_state, state)
+        title, message, extra = render(merged_state, data)
+        changes = dict(
+            title=title,
+            message=message,
+            user_ids=list(dict.fromkeys([*notification.user_ids, *user_ids])),
+            # merged push is about several actors, none of them is named in its data
+            data={key: value for key, value in {**data, **extra}.items() if key not in actor_keys},
+            coalesce_state=merged_state,
+        )
+        # row merged or claimed by other worker meanwhile is left as it is
+        if pending.filter(pk=notification.pk, merged=notification.merged).update(
+                merged=F('merged') + 1, **changes):
+            for field, value in changes.items():
+                setattr(notification, field, value)
+            notification.merged += 1
+            return notification
+    title, message, extra = render(state, data)
+    return NotificationOutbox.objects.create(
+        title=title,
+        message=message,
+        user_ids=user_ids,
+        data={**data, **extra},
+        coalesce_key=coalesce_key,
+        coalesce_state=state,
+        next_attempt=now + timedelta(seconds=NOTIFICATION_COALESCE_WINDOW),
+    )
+
+
+def enqueue_topic_notification(topic: str, title: str, message: str, **kwargs) -> NotificationOutbox:
+    '''
+    like enqueue_notification, but delivered as one send to fcm topic
+    '''
+    return NotificationOutbox.objects.create(
+        title=str(title),
+        message=str(message),
+        topic=topic,
+        data={str(key): str(value) for key, value in kwargs.items()},
+        next_attempt=timezone.now(),
+    )
+
+
+def retry_delay(attempts: int) -> int:
+    return min(OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), OUTBOX_MAX_RETRY_DELAY)
+
+
+def _due(now):
+    # sending rows whose lease is over were claimed by worker which died
+    return NotificationOutbox.objects.filter(status__in=[Statuses.pending, Statuses.sending], next_attempt__lte=now)
+
+
+def claim(notification: NotificationOutbox) -> bool:
+    '''
+    take notification for this worker till lease ends, false if other worker took it first,
+    lease starts now and not when batch was read, so late rows of slow batch keep whole lease
+    '''
+    now = timezone.now()
+    claimed = _due(now).filter(pk=notification.pk).update(
+        status=Statuses.sending, attempts=F('attempts') + 1, next_attempt=now + timedelta(seconds=OUTBOX_LEASE))
+    if claimed:
+        notification.attempts += 1
+    return bool(claimed)
+
+
+def deliver(notification: NotificationOutbox) -> dict:
+    if notification.topic:
+        message_id = send_topic_push(notification.topic, notification.title, notification.message,
+                                     **notification.data)
+        return {'topic': notification.topic, 'message_id': message_id}
+    users = 'all' if notification.broadcast else notification.user_ids
+    if notification.tokens:
+        # retry after partial delivery goes only to tokens which did not get the push
+        return send_firebase_multiple_messages(notification.title, notification.message, users, batch_retries=0,
+                                               tokens=notification.tokens, **notification.data)
+    if not users:
+        return {'success_count': 0, 'len_devices_tokens': 0}
+    # batches are not retried in pool threads, outbox retries with backoff so delivery stays within lease
+    return send_firebase_multiple_messages(notification.title, notification.message, users, batch_retries=0,
+                                           **notification.data)
+
+
+def deliver_outbox(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    '''
+    send due notifications, failed ones are retried with exponential backoff, return how many were sent
+    '''
+    sent = 0
+    for notification in _due(timezone.now()).order_by('next_attempt', 'id')[:batch_size]:
+        if not claim(notification):
+            continue
+        try:
+            deliver(notification)
+        except Exception as e:
+            failed = notification.attempts >= OUTBOX_MAX_ATTEMPTS
+            print(f'[OUTBOX] {notification} attempt {notification.attempts} failed: {e!r}')
+            changes = {}
+            if isinstance(e, PartialDelivery):
+                # tokens which got the push are not sent again
+                changes['tokens'] = e.tokens
+            NotificationOutbox.objects.filter(pk=notification.pk).update(
+                status=Statuses.failed if failed else Statuses.pending,
+                next_attempt=timezone.now() + timedelta(seconds=retry_delay(notification.attempts)),
+                last_error=repr(e),
+                **changes,
+            )
+        else:
+            NotificationOutbox.objects.filter(pk=notification.pk).update(
+                status=Statuses.sent, sent=timezone.now(), last_error='')
+            sent += 1
+    return sent
@@ -0,0 +1,137 @@
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from united_help.helpers import str_to_bool
+
+
+def is_cursor_requested(request, cursor_query_param: str = 'cursor') -> bool:
+    return request.query_params.get('pagination') == 'cursor' or cursor_query_param in request.query_params
+
+
+class KeysetPagination(BasePagination):
+    '''
+    pages are taken by WHERE (ordering) > (last row of previous page), so every page costs the same,
+    cursor is opaque token with ordering values of last row, count is computed only if count=true
+    '''
+    ordering = ('id', )
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, cursor_query_param: str = None):
+        if cursor_query_param:
+            self.cursor_query_param = cursor_query_param
+        self.count = None
+        self.next_position = None
+
+    def get_page_size(self, request) -> int:
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True,
+                                 cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def encode_cursor(self, position: list) -> str:
+        values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in position]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # every value is parsed by its model field, so crafted cursor can not reach the query
+        try:
+            position = [model._meta.get_field(field).to_python(value) for field, value in zip(self.ordering, position)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def after(self, position: list) -> Q:
+        # (a, b) > (x, y) is a > x or (a = x and b > y)
+        q = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            q |= Q(**equal, **{f'{field}__gt': value})
+            equal[field] = value
+        return q
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if str_to_bool(request.query_params.get(self.count_query_param)):
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(*self.ordering)
+        if (position := self.decode_cursor(request, queryset.model)) is not None:
+            queryset = queryset.filter(self.after(position))
+        results = list(queryset[:page_size + 1])
+        page = results[:page_size]
+        if len(results) > page_size:
+            self.next_position = [getattr(page[-1], field) for field in self.ordering]
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([('next', self.get_next_link())])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+
+class EventKeysetPagination(KeysetPagination):
+    ordering = ('start_time', 'id')
+
+
+class CommentKeysetPagination(KeysetPagination):
+    ordering = ('id', )
+
+
+class OptionalKeysetPaginationMixin:
+    '''
+    view keeps default pagination unless client asks for pagination=cursor or sends cursor
+    '''
+    keyset_pagination_class = None
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator') and self.keyset_pagination_class is not None
+                and is_cursor_requested(self.request, self.keyset_pagination_class.cursor_query_param)):
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
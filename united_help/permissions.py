@@ -1,5 +1,6 @@
 from rest_framework import permissions
-from united_help.models import User, Profile
+from united_help.models import Profile
+from united_help.roles import get_roles
 
 
 class IsReadOnly(permissions.BasePermission):
@@ -19,26 +20,22 @@ class IsOwner(permissions.BasePermission):
 
 class IsAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = User.objects.get(id=request.user.id)
-        return user.profile_set.filter(role=Profile.Roles.admin).exists()
+        return get_roles(request).has(Profile.Roles.admin)
 
 
 class IsOrganizer(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = User.objects.get(id=request.user.id)
-        return user.profile_set.filter(role=Profile.Roles.organizer).exists()
+        return get_roles(request).has(Profile.Roles.organizer)
 
 
 class IsVolunteer(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = User.objects.get(id=request.user.id)
-        return user.profile_set.filter(role=Profile.Roles.volunteer).exists()
+        return get_roles(request).has(Profile.Roles.volunteer)
 
 
 class IsRefugee(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = User.objects.get(id=request.user.id)
-        return user.profile_set.filter(role=Profile.Roles.refugee).exists()
+        return get_roles(request).has(Profile.Roles.refugee)
 
 
 class IsOwnerOrReadOnly(IsReadOnly, IsOwner):
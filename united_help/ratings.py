@@ -0,0 +1,50 @@
+from django.db.models import F, Case, When, Value, FloatField, Count, Sum
+from django.db.models.functions import Cast
+
+from united_help.models import Profile, Voting
+
+
+def change_rating(profile_id: int, votes: int, scores: int):
+    '''
+    add votes with their scores to profile aggregates by one UPDATE,
+    expressions of SET see the row before update so concurrent votes are not lost
+    '''
+    vote_count = F('vote_count') + votes
+    score_sum = F('score_sum') + scores
+    Profile.objects.filter(pk=profile_id).update(
+        vote_count=vote_count,
+        score_sum=score_sum,
+        rating=Case(
+            When(vote_count__lte=-votes, then=Value(0.0)),
+            default=Cast(score_sum, FloatField()) / vote_count,
+            output_field=FloatField(),
+        ),
+    )
+
+
+def vote_added(vote: Voting):
+    change_rating(vote.applicant_id, 1, int(vote.score))
+
+
+def vote_removed(vote: Voting):
+    change_rating(vote.applicant_id, -1, -int(vote.score))
+
+
+def reconcile_ratings(fix: bool = True) -> list[tuple[Profile, int, int]]:
+    '''
+    recompute aggregates from votes by one GROUP BY, return (profile, vote_count, score_sum) which drifted
+    '''
+    totals = {
+        row['applicant_id']: (row['count'], row['total'])
+        for row in Voting.objects.values('applicant_id').annotate(count=Count('id'), total=Sum('score'))
+    }
+    drifted = []
+    for profile in Profile.objects.only('id', 'vote_count', 'score_sum', 'rating'):
+        vote_count, score_sum = totals.get(profile.id, (0, 0))
+        rating = score_sum / vote_count if vote_count else 0
+        if (profile.vote_count, profile.score_sum, profile.rating) != (vote_count, score_sum, rating):
+            drifted.append((profile, vote_count, score_sum))
+            if fix:
+                Profile.objects.filter(pk=profile.pk).update(vote_count=vote_count, score_sum=score_sum,
+                                                             rating=rating)
+    return drifted
@@ -0,0 +1,171 @@
+import time
+from threading import Lock
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction, DEFAULT_DB_ALIAS
+
+from united_help.counters import next_shared_value, shared_value
+from united_help.helpers import LRUCache, MISSING
+from united_help.models import Profile
+from united_help.settings import ROLE_CACHE_TTL, ROLE_CACHE_CHECK_INTERVAL, ROLE_CACHE_SIZE
+
+# role -> (profile id, active)
+RoleMap = dict[int, tuple[int, bool]]
+
+# every committed profile change takes next version, user id of the change is kept in cache under it
+VERSION_COUNTER = 'roles'
+CHANGE_TTL = 60 * 60
+
+stats = {
+    'hits': 0,
+    'misses': 0,
+    'invalidations': 0,
+    'clears': 0,
+}
+
+# role maps of this worker, profile changes of other workers drop them at the next version check
+_lru = LRUCache(ROLE_CACHE_SIZE)
+_version = {'seen': None, 'checked': 0.0}
+_version_lock = Lock()
+
+
+def change_key(version: int) -> str:
+    return f'roles:change:{version}'
+
+
+def _load_role_map(user_id: int) -> RoleMap:
+    # the first active profile of every role, the first inactive one only if role has no active profile
+    role_map = {}
+    for profile_id, role, active in Profile.objects.filter(user_id=user_id).order_by('-active', 'id').values_list(
+            'id', 'role', 'active'):
+        role_map.setdefault(role, (profile_id, active))
+    return role_map
+
+
+def _check_version():
+    '''
+    drop role maps of users changed by other workers, one read of shared version per ROLE_CACHE_CHECK_INTERVAL,
+    whole lru is dropped when changes are lost
+    '''
+    with _version_lock:
+        if time.monotonic() - _version['checked'] < ROLE_CACHE_CHECK_INTERVAL:
+            return
+        _version['checked'] = time.monotonic()
+        version, seen = shared_value(VERSION_COUNTER), _version['seen']
+        if seen is not None and seen < version:
+            keys = [change_key(v) for v in range(seen + 1, version + 1)]
+            changes = cache.get_many(keys) if len(keys) <= ROLE_CACHE_SIZE else {}
+            if len(changes) == len(keys):
+                for user_id in changes.values():
+                    _lru.delete(user_id)
+                _version['seen'] = version
+                return
+        if seen != version:
+            _lru.clear()
+            stats['clears'] += seen is not None
+        _version['seen'] = version
+
+
+def get_role_map(user_id: int) -> RoleMap:
+    '''
+    role map from worker lru, from database when it is not there
+    '''
+    _check_version()
+    role_map = _lru.get(user_id)
+    if role_map is not MISSING:
+        stats['hits'] += 1
+        return role_map
+    stats['misses'] += 1
+    role_map = _load_role_map(user_id)
+    _lru.set(user_id, role_map, ROLE_CACHE_TTL)
+    return role_map
+
+
+def invalidate_roles(user_id: int):
+    '''
+    drop role map of user in this worker, after commit again and in other workers by new shared version,
+    so map loaded before the change is committed does not stay
+    '''
+    def publish():
+        _lru.delete(user_id)
+        cache.set(change_key(next_shared_value(VERSION_COUNTER)), user_id, CHANGE_TTL)
+    _lru.delete(user_id)
+    transaction.on_commit(publish)
+    stats['invalidations'] += 1
+
+
+def get_stats() -> dict:
+    lookups = stats['hits'] + stats['misses']
+    return {
+        **stats,
+        'hit_rate': stats['hits'] / lookups if lookups else 0,
+        'size': len(_lru),
+    }
+
+
+class RequestRoles:
+    '''
+    role -> Profile of request user, role checks are answered by cached role map,
+    profiles are built from it with other fields deferred, so they are loaded only when view reads them
+    '''
+    def __init__(self, user):
+        self.user_id = user.id
+        self._role_map: Optional[RoleMap] = None
+        self._profiles: dict[int, Profile] = {}
+
+    @property
+    def role_map(self) -> RoleMap:
+        if self._role_map is None:
+            self._role_map = get_role_map(self.user_id)
+        return self._role_map
+
+    def _profile(self, role: int) -> Profile:
+        if role not in self._profiles:
+            profile_id, active = self.role_map[role]
+            profile = Profile.from_db(DEFAULT_DB_ALIAS, ['id', 'user_id', 'role', 'active'],
+                                      [profile_id, self.user_id, role, active])
+            self._profiles[role] = profile
+        return self._profiles[role]
+
+    def has(self, role: int) -> bool:
+        # permissions do not look at active flag
+        return role in self.role_map
+
+    def profile(self, role: int, active: bool = True) -> Optional[Profile]:
+        if role not in self.role_map or (active and not self.role_map[role][1]):
+            return None
+        return self._profile(role)
+
+    def first(self) -> Optional[Profile]:
+        if not self.role_map:
+            return None
+        return self._profile(min(self.role_map, key=lambda role: self.role_map[role][0]))
+
+    @property
+    def admin(self) -> Optional[Profile]:
+        return self.profile(Profile.Roles.admin)
+
+    @property
+    def volunteer(self) -> Optional[Profile]:
+        return self.profile(Profile.Roles.volunteer)
+
+    @property
+    def organizer(self) -> Optional[Profile]:
+        return self.profile(Profile.Roles.organizer)
+
+    @property
+    def refugee(self) -> Optional[Profile]:
+        return self.profile(Profile.Roles.refugee)
+
+
+def get_roles(request) -> RequestRoles:
+    '''
+    roles of request user, kept on django request so permissions, views and serializers share them
+    '''
+    user = request.user
+    request = getattr(request, '_request', request)
+    roles = getattr(request, 'roles', None)
+    if roles is None or roles.user_id != user.id:
+        roles = request.roles = RequestRoles(user)
+    return roles
@@ -1,7 +1,9 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from united_help.services import get_workers_pids
-from united_help.tasks import event_finished, event_start_tomorrow
+from united_help.settings import OUTBOX_POLL_INTERVAL, TOPIC_RECONCILE_INTERVAL, GEOCODE_CACHE_EVICT_INTERVAL
+from united_help.tasks import event_finished, event_start_tomorrow, geocode_pending_events, deliver_notifications, \
+    reconcile_topic_subscriptions, sync_topic_tokens, evict_geocode_cache
 
 
 def init_scheduler():
@@ -11,4 +13,9 @@ def init_scheduler():
         scheduler = BackgroundScheduler()
         scheduler.add_job(event_finished, 'interval', minutes=5)
         scheduler.add_job(event_start_tomorrow, 'interval', minutes=1320)
+        scheduler.add_job(geocode_pending_events, 'interval', minutes=1)
+        scheduler.add_job(evict_geocode_cache, 'interval', minutes=GEOCODE_CACHE_EVICT_INTERVAL)
+        scheduler.add_job(deliver_notifications, 'interval', seconds=OUTBOX_POLL_INTERVAL)
+        scheduler.add_job(sync_topic_tokens, 'interval', minutes=1)
+        scheduler.add_job(reconcile_topic_subscriptions, 'interval', minutes=TOPIC_RECONCILE_INTERVAL)
         scheduler.start()
@@ -0,0 +1,105 @@
+import re
+from typing import Optional
+
+from django.db import connection, OperationalError
+from django.db.models import Q, QuerySet
+
+from united_help.models import Event
+
+
+FTS_TABLE = 'united_help_event_fts'
+
+
+def search_tokens(query: str) -> list[str]:
+    return re.findall(r'\w+', query.lower())
+
+
+class LikeSearchBackend:
+    '''
+    fallback for databases without full-text index, plain LIKE '%x%' without ranking
+    '''
+    def search(self, queryset: QuerySet, query: str, in_description: bool = True) -> QuerySet:
+        if in_description:
+            return queryset.filter(Q(name__contains=query) | Q(description__contains=query))
+        return queryset.filter(name__contains=query)
+
+    def index(self, event: Event):
+        pass
+
+    def remove(self, event_id: int):
+        pass
+
+    def rebuild(self) -> int:
+        return 0
+
+
+class SqliteFtsSearchBackend(LikeSearchBackend):
+    '''
+    sqlite FTS5 table with event id as rowid, ranked by bm25 where name weights more than description,
+    match is joined into the filtered queryset so other filters and pagination apply to all matches
+    '''
+    NAME_WEIGHT = 10.0
+    DESCRIPTION_WEIGHT = 1.0
+
+    @staticmethod
+    def match_expression(tokens: list[str], in_description: bool) -> str:
+        # every token is quoted phrase with prefix search, so user input can not break fts syntax
+        phrases = [f'"{token}"*' for token in tokens]
+        if not in_description:
+            phrases = [f'name : {phrase}' for phrase in phrases]
+        return ' AND '.join(phrases)
+
+    def search(self, queryset: QuerySet, query: str, in_description: bool = True) -> QuerySet:
+        tokens = search_tokens(query)
+        if not tokens:
+            return super().search(queryset, query, in_description)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {Event._meta.db_table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[self.match_expression(tokens, in_description)],
+            select={'search_rank': f'bm25({FTS_TABLE}, %s, %s)'},
+            select_params=[self.NAME_WEIGHT, self.DESCRIPTION_WEIGHT],
+            order_by=['search_rank'],
+        )
+
+    def index(self, event: Event):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [event.pk])
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                           [event.pk, event.name, event.description])
+
+    def remove(self, event_id: int):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [event_id])
+
+    def rebuild(self) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+                           f'SELECT id, name, description FROM {Event._meta.db_table}')
+            return cursor.rowcount
+
+
+_backend: Optional[LikeSearchBackend] = None
+
+
+def get_search_backend() -> LikeSearchBackend:
+    global _backend
+    if _backend is None:
+        _backend = SqliteFtsSearchBackend() if fts_available() else LikeSearchBackend()
+    return _backend
+
+
+def fts_available() -> bool:
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM sqlite_master WHERE type = %s AND name = %s', ['table', FTS_TABLE])
+            return cursor.fetchone() is not None
+    except OperationalError:
+        return False
+
+
+def search_events(queryset: QuerySet, query: str, in_description: bool = True) -> QuerySet:
+    return get_search_backend().search(queryset, query, in_description)
@@ -3,22 +3,33 @@ import datetime
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from united_help.models import Event, User, City, Skill, Profile, Comment, EventLog, Voting
+from united_help.models import Event, User, City, Skill, Profile, Comment, EventLog, Voting, WaitlistEntry, \
+    DeviceToken
+from united_help.skill_tree import would_create_cycle
+from united_help.subscriptions import waitlist_position
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
 
 
+def get_following_ids(context: dict) -> set[int]:
+    '''
+    ids of profiles followed by request user, loaded once per serializer context,
+    nested and list serializers share context of their root
+    '''
+    if 'following_ids' not in context:
+        request = context['request']
+        context['following_ids'] = set(User.following.through.objects.filter(
+            user_id=request.user.id).values_list('profile_id', flat=True))
+    return context['following_ids']
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     is_subscribe = serializers.SerializerMethodField()
     image = Base64ImageField()
 
     def get_is_subscribe(self, obj):
-        if request := self.context.get('request'):
-            user = User.objects.get(id=request.user.id)
-            if user.following.filter(id=obj.id).exists():
-                return True
-            else:
-                return False
+        if self.context.get('request'):
+            return obj.id in get_following_ids(self.context)
         return None
 
     def validate_role(self, value):
@@ -121,26 +132,24 @@ class ActivateProfileSerializer(serializers.ModelSerializer):
 class EventSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
     is_subscribe = serializers.SerializerMethodField()
+    # present only when events are searched near some point
+    distance_km = serializers.FloatField(read_only=True)
 
     def get_is_subscribe(self, obj):
         if request := self.context.get('request'):
-            user = User.objects.get(id=request.user.id)
-            participant = Profile.objects.filter(user=user, role=obj.to)
-            is_participant = participant.exists() and participant.first() in obj.participants.all()
-            if is_participant:
-                return True
-            else:
-                return False
+            if hasattr(obj, 'is_subscribe'):
+                # annotated by EventsView
+                return obj.is_subscribe
+            return obj.participants.filter(user_id=request.user.id, role=obj.to).exists()
         return None
 
-
     class Meta:
         model = Event
         fields = ('id', 'active', 'name', 'description', 'reg_date',
                   'start_time', 'end_time', 'image', 'city', 'location',
                   'location_lat', 'location_lon',
                   'employment', 'owner', 'participants', 'skills', 'to',
-                  'required_members', 'is_subscribe',
+                  'required_members', 'is_subscribe', 'distance_km',
                   )
         read_only_fields = ('id', 'owner', 'reg_date')
 
@@ -149,7 +158,7 @@ class EventSubscribeSerializer(serializers.ModelSerializer):
     subscribed_members = serializers.SerializerMethodField()
 
     def get_subscribed_members(self, obj):
-        return obj.participants.count()
+        return obj.participants_count
 
     class Meta:
         model = Event
@@ -169,21 +178,14 @@ class EventFinishedSerializer(serializers.ModelSerializer):
     rating = serializers.SerializerMethodField()
 
     def get_subscribed_members(self, obj):
-        return obj.participants.count()
+        return obj.participants_count
 
     def get_comments_count(self, obj):
-        return obj.comment_set.count()
+        return obj.comments_count
 
     def get_rating(self, obj):
-        profile = obj.owner
-        votes: list[Voting] = Voting.objects.filter(applicant=profile)
-        votes_sum = 0
-        for vote in votes:
-            votes_sum += vote.score
-        if votes.count() == 0:
-            return 0
-        else:
-            return votes_sum / votes.count()
+        # kept up to date by votes, see ratings.py
+        return obj.owner.rating
 
     class Meta:
         model = Event
@@ -201,6 +203,18 @@ class EventFinishedSerializer(serializers.ModelSerializer):
                   )
 
 
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    queue_position = serializers.SerializerMethodField()
+
+    def get_queue_position(self, obj):
+        return waitlist_position(obj)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ('id', 'event', 'profile', 'position', 'queue_position', 'created',)
+        read_only_fields = ('id', 'event', 'profile', 'position', 'queue_position', 'created',)
+
+
 class FinishEventSerializer(serializers.ModelSerializer):
     volunteers_attended = serializers.ListSerializer(child=serializers.IntegerField(), write_only=True)
     message = serializers.CharField()
@@ -291,37 +305,20 @@ class VotingSerializer(serializers.ModelSerializer):
 class CitySerializer(serializers.ModelSerializer):
     class Meta:
         model = City
-        fields = ('id', 'city', 'alias',
+        fields = ('id', 'city', 'alias', 'lat', 'lon',
+                  'min_lat', 'min_lon', 'max_lat', 'max_lon',
                   )
         read_only_fields = ('id',)
 
 
 class SkillSerializer(serializers.ModelSerializer):
 
-    def is_self_parent(self, instance_orig, inst, stack: list):
-        print(f'{instance_orig=} {inst=} {stack=}')
-        if instance_orig.id == inst.id:
-            return True
-        if inst.id in stack:
-            return True
-        stack.append(inst.id)
-        if not inst.parents:
-            return False
-        else:
-            for parent in inst.parents.all():
-                return self.is_self_parent(instance_orig, parent, stack)
-
-    def update(self, instance, validated_data: dict):
-        # TODO разобраться с тупой хуйней, когда при проверке зацикливания родителей какого-то
-        #  хуя объект при назначении родителя становится родителем сам для своего родителя
-        # self_parents = []
-        # if isinstance(parents := validated_data.get('parents'), list):
-        #     for parent in parents:
-        #         self_parent = self.is_self_parent(instance, parent, [instance.id])
-        #         if self_parent:
-        #             validated_data.pop('parents')
-        #             break
-        return super().update(instance, validated_data)
+    def validate_parents(self, parents):
+        if self.instance is not None:
+            for parent in parents:
+                if would_create_cycle(self.instance.id, parent.id):
+                    raise serializers.ValidationError(f'{parent} is already a descendant of {self.instance}')
+        return parents
 
     class Meta:
         model = Skill
@@ -361,7 +358,8 @@ class ProfileSubscribeSerializer(serializers.ModelSerializer):
 
 
 class UserAddFirebaseTokenSerializer(serializers.Serializer):
-    token = serializers.CharField()
+    token = serializers.CharField(max_length=512)
+    platform = serializers.ChoiceField(choices=DeviceToken.Platforms.choices, required=False)
 
 
 class CancelEventSerializer(serializers.Serializer):
@@ -1,29 +1,33 @@
 import os
 import subprocess
 
-from firebase_admin import messaging
-from rest_framework.utils import json
-import requests
-import urllib.parse
-
-from united_help.models import User
-
-
-COUNTRY_NAME = 'Украина'
-
-
-def send_topic_push(topic, title, body):
+from united_help import geocode_cache
+from united_help.devices import recipient_tokens, record_results
+from united_help.fanout import build_payload, fan_out, fan_out_stats, failed_tokens, PartialDelivery
+from united_help.fcm import get_messaging
+from united_help.gazetteer import city_centroid
+from united_help.geocoder import get_geocoder, GeocoderUnavailable
+from united_help.models import User, Event
+from united_help.settings import PUSH_BATCH_RETRIES
+from united_help.spatial import invalidate_cluster_tiles
+
+
+def send_topic_push(topic, title, body, **kwargs):
+    '''
+    one message to every device subscribed to topic, fcm does the fan-out
+    '''
+    messaging = get_messaging()
+    payload = build_payload(title, body, messaging, **kwargs)
     message = messaging.Message(
-        notification=messaging.Notification(
-            title=title,
-            body=body,
-        ),
+        notification=payload.notification,
+        data=payload.data,
         topic=topic,
     )
-    messaging.send(message)
+    return messaging.send(message)
 
 
 def send_token_push(title, body, tokens):
+    messaging = get_messaging()
     message = messaging.MulticastMessage(
         notification=messaging.Notification(
             title=title,
@@ -34,109 +38,123 @@ def send_token_push(title, body, tokens):
     messaging.send_multicast(message)
 
 
-def get_fine_location(city: str, string_location: str):
+class LocationNotFound(Exception):
+    pass
+
 
-    is_three_word_location = True
+def parse_three_word_location(string_location: str) -> str | None:
+    '''
+    return what3words address joined by dots or None if it is ordinary address
+    '''
     separator = '.'
+    if len(string_location.split()) == 3:
+        separator = ' '
+    elif len(string_location.split('.')) != 3:
+        return None
 
-    if len(string_location.split()) == 3 or len(string_location.split('.')) == 3:
-        if len(string_location.split()) == 3:
-            separator = ' '
+    words = string_location.split(separator)
+    for word in words:
+        if not word.isalpha():
+            return None
+    return '.'.join(words)
 
-        for word in string_location.split(separator):
-            if not word.isalpha():
-                is_three_word_location = False
-                break
-    else:
-        is_three_word_location = False
-
-    if is_three_word_location:
-        three_word_location = '.'.join(string_location.split(separator))
-        url = f'https://w3w.co/{three_word_location}?alias={three_word_location}'
-        response = requests.get(url).text
-        start = response.find('https://mapapi.what3words.com/map/minimap?lat=') + len(
-                                                'https://mapapi.what3words.com/map/minimap?')
-        finish = start + 50
-        parse_text = response[start: finish]
-        lat = parse_text[parse_text.find('lat=')+4: parse_text.find('&')]
-        lon_start = parse_text.find('lng=')
-        lon = parse_text[lon_start+4: parse_text[lon_start:].find('&') + lon_start]
-        display_location_prestart = response.find('og:description') + len('og:description"')
-        display_location_start = response[display_location_prestart:].find('"') + display_location_prestart + 1
-        display_location_finish = response[display_location_start:].find('"') + display_location_start
-        display_location = response[display_location_start: display_location_finish]
-    else:
-        URL = 'https://nominatim.openstreetmap.org/search/{}?format=json'
-        url = URL.format(urllib.parse.quote(f'{COUNTRY_NAME} {city} {string_location}'))
-        response = requests.get(url).json()
-        if not response:
-            url = URL.format(urllib.parse.quote(f'{COUNTRY_NAME} {string_location}'))
-            response = requests.get(url).json()
-
-        lat = response[0]["lat"]
-        lon = response[0]["lon"]
-        display_location = response[0]["display_name"]
-    return lat, lon, display_location
-
-
-def send_firebase_multiple_messages(title: str, message: str, users: list[User] | str, **kwargs):
-    devices_tokens = []
-    batch_size = 500
-    # firebase multicastmessage отправляет за раз не более чем 500 сообщений
-
-    if users == 'all':
-        users = User.objects.all()
-
-    # если же мне пришли юзеры в виде списка
-    elif isinstance(users, list) and isinstance(users[0], int):
-        users = User.objects.all()
-
-    for user in users:
-        # for notification in notifications_list:
-        #     if not getattr(user, notification):
-        #         break
-        # else:
-        if user.firebase_tokens:
-            tokens = user.firebase_tokens.split()
-            devices_tokens += tokens
-            print(f'send message to {user.username} {user.email} with token {user.firebase_tokens} ')
-    if devices_tokens:
-        success_count = 0
-        all_users_whom_sended = [f"  {u.pk} {u.email}" for u in users]
-
-        for i in range(len(devices_tokens) // batch_size + 1):
-            data = {
-                'title': str(title),
-                'text': str(message),
-                # for ios
-                'content-available': '1',
-                'aps': json.dumps({
-                    'category': 'player',
-                })
-            }
-            for key, val in kwargs.items():
-                if key == 'text' or key == 'title':
-                    continue
-                data[str(key)] = str(val)
-            image = data['image'] if 'image' in data else '0'
-
-            fire_message = messaging.MulticastMessage(
-                notification=messaging.Notification(title=title, body=message, image=image),
-                tokens=devices_tokens[i * batch_size: min(len(devices_tokens), (i + 1) * batch_size)],
-                data=data,
-            )
-            response = messaging.send_multicast(fire_message)
-
-            all_tokens = len(devices_tokens[i * batch_size: min(len(devices_tokens), (i + 1) * batch_size)])
-            users_whom_sended = all_users_whom_sended[i * batch_size: min(len(devices_tokens), (i + 1) * batch_size)]
-            print(
-                f'[FIREBASE] {response.success_count}/{all_tokens} messages were sent successfully ({users_whom_sended})')
-            success_count += response.success_count
-        return {'success_count': success_count, 'len_devices_tokens': len(devices_tokens)}
+
+def fetch_fine_location(city: str, string_location: str):
+    three_word_location = parse_three_word_location(string_location)
+    location = get_geocoder().locate(city, string_location, three_word_location)
+    if location is None:
+        raise LocationNotFound(string_location)
+    return location
+
+
+def get_fine_location(city: str, string_location: str, fallback: bool = True):
+    '''
+    return (lat, lon, display_location) of location in city,
+    if upstream does not know location or is unavailable return city centroid when fallback is set,
+    otherwise raise LocationNotFound or GeocoderUnavailable
+    '''
+    try:
+        return _get_precise_location(city, string_location)
+    except (LocationNotFound, GeocoderUnavailable):
+        if fallback and (centroid := city_centroid(city)):
+            return centroid
+        raise
+
+
+def _get_precise_location(city: str, string_location: str):
+    cache_key_location = parse_three_word_location(string_location) or string_location
+    cached = geocode_cache.get(city, cache_key_location)
+    if cached is None:
+        raise LocationNotFound(string_location)
+    if cached is not geocode_cache.MISSING:
+        return cached
+
+    try:
+        location = fetch_fine_location(city, string_location)
+    except LocationNotFound:
+        geocode_cache.put(city, cache_key_location, None)
+        raise
+    geocode_cache.put(city, cache_key_location, location)
+    return location
+
+
+def geocode_event(event: Event) -> bool:
+    '''
+    resolve coordinates of event which is waiting in geocode queue
+    return True if event left the queue
+    '''
+    try:
+        lat, lon, display_location = get_fine_location(event.city.city, event.location, fallback=False)
+    except GeocoderUnavailable as e:
+        # upstream is unavailable, event stays pending till next run
+        print(f'[GEOCODE] {event} {e}')
+        return False
+    except LocationNotFound as e:
+        # address is not found, there is no sense to retry it, event stays in city center
+        print(f'[GEOCODE] {event} not found {e}')
+        lat, lon, display_location = city_centroid(event.city) or (0, 0, '')
+
+    # location could be changed while we are waiting for upstream, then event stays pending
+    geohash = Event.make_geohash(lat, lon)
+    updated = Event.objects.filter(pk=event.pk, location=event.location).update(
+        location_lat=lat,
+        location_lon=lon,
+        location_display=display_location[:255],
+        geohash=geohash,
+        geocode_pending=False,
+    )
+    if updated:
+        invalidate_cluster_tiles(event.geohash, geohash)
+    return True
+
+
+def send_firebase_multiple_messages(title: str, message: str, users: list[User] | str,
+                                    batch_retries: int = PUSH_BATCH_RETRIES, tokens: list[str] = None, **kwargs):
+    # firebase multicastmessage отправляет за раз не более чем 500 сообщений, батчи отправляются параллельно
+    # batches which failed after batch_retries are raised as PartialDelivery with their tokens,
+    # tokens given by caller are sent instead of all tokens of users
+
+    if tokens is not None:
+        devices_tokens = list(tokens)
     else:
+        # one join over device tokens instead of reading tokens of every user
+        devices_tokens = list(recipient_tokens(users).order_by('id').values_list('token', flat=True))
+    if not devices_tokens:
         print('[FIREBASE] tokens are empty')
         return {'success_count': 0, 'len_devices_tokens': 0}
 
+    results = fan_out(build_payload(title, message, **kwargs), devices_tokens, retries=batch_retries)
+    pruned = 0
+    for result in results:
+        if result.error is None:
+            pruned += record_results(result.tokens, result.responses)[0]
+    stats = fan_out_stats(results)
+    print(f'[FIREBASE] {stats["success_count"]}/{stats["len_devices_tokens"]} messages were sent successfully '
+          f'in {stats["batches"]} batches, {stats["failed_batches"]} batches failed, {pruned} dead tokens pruned')
+    if stats['failed_batches']:
+        raise PartialDelivery(failed_tokens(results), stats)
+    return stats
+
 
 def get_workers_pids(_list=None, mutated=[]):
     if (mutated!=[]):
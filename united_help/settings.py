@@ -180,6 +180,73 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_ROOT = BASE_DIR / 'media'
 BASE_URL = ''
 
+# how many events geocode worker resolves per run
+GEOCODE_BATCH_SIZE = 50
+# geocode cache, ttl in seconds
+GEOCODE_CACHE_TTL = 60 * 60 * 24 * 30
+GEOCODE_CACHE_NEGATIVE_TTL = 60 * 60 * 24
+GEOCODE_CACHE_MAX_SIZE = 50000
+GEOCODE_CACHE_LRU_SIZE = 2048
+# seconds between writes of last_used of one location, minutes between evictions
+GEOCODE_CACHE_TOUCH_INTERVAL = 60 * 60
+GEOCODE_CACHE_EVICT_INTERVAL = 10
+# geocoder upstreams, could be pointed to local fake servers
+GEOCODER_NOMINATIM_URL = 'https://nominatim.openstreetmap.org'
+GEOCODER_W3W_URL = 'https://w3w.co'
+# seconds for one http request and for the whole lookup
+GEOCODER_TIMEOUT = 5
+GEOCODER_DEADLINE = 10
+# nominatim usage policy allows 1 request per second
+GEOCODER_RATE = 1
+GEOCODER_BURST = 1
+GEOCODER_FAILURE_THRESHOLD = 5
+GEOCODER_RESET_TIMEOUT = 60
+GEOCODER_POOL_SIZE = 4
+
+# default radius of events/?near=lat,lon search
+EVENTS_NEAR_RADIUS_KM = 10
+# larger circles would make geohash ranges cover most of the table
+EVENTS_NEAR_MAX_RADIUS_KM = 500
+# map clusters are cached per geohash tile and dropped when events in tile change
+EVENT_CLUSTERS_CACHE_TTL = 60 * 60
+EVENT_CLUSTERS_MAX_TILES = 64
+
+# seconds between checks whether other workers changed event skills
+SKILL_INDEX_CHECK_INTERVAL = 5
+
+# 'firebase' or 'fake', fake keeps pushes in memory so notifications could be tried offline
+PUSH_BACKEND = 'firebase'
+# multicast fan-out, fcm accepts up to 500 tokens per batch
+PUSH_BATCH_SIZE = 500
+PUSH_WORKERS = 8
+PUSH_BATCH_RETRIES = 3
+# seconds before first retry of batch, doubles after every attempt
+PUSH_RETRY_DELAY = 1
+# device token is skipped after this many failed sends in a row, seconds till it is tried again
+DEVICE_TOKEN_MAX_FAILURES = 5
+DEVICE_TOKEN_RETRY_AFTER = 24 * 60 * 60
+# notifications are written to outbox with the change and delivered by worker
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 5
+OUTBOX_MAX_ATTEMPTS = 8
+# retry delay doubles after every failed attempt, seconds
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_MAX_RETRY_DELAY = 60 * 60
+# notification claimed by worker which died is taken again after lease
+OUTBOX_LEASE = 5 * 60
+# seconds notification about event waits in outbox for others of the same kind to merge with, 0 sends at once
+NOTIFICATION_COALESCE_WINDOW = 60
+# followers of organizer get pushes through its fcm topic, minutes between checks of topic subscriptions
+TOPIC_RECONCILE_INTERVAL = 60
+# tokens whose topic calls failed are synced again every minute, this many at once
+TOPIC_SYNC_BATCH_SIZE = 500
+
+# roles of users are kept in lru of every worker, profile change bumps shared version
+# and workers look for changed users every ROLE_CACHE_CHECK_INTERVAL seconds
+ROLE_CACHE_TTL = 10 * 60
+ROLE_CACHE_CHECK_INTERVAL = 1
+ROLE_CACHE_SIZE = 4096
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,162 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from united_help.counters import add_participants, add_comments, recount_participants
+from united_help.gazetteer import invalidate_city_index
+from united_help.models import City, Event, Skill, Voting, Comment, Profile, User, DeviceToken
+from united_help.ratings import change_rating, vote_added, vote_removed
+from united_help.roles import invalidate_roles
+from united_help.search import get_search_backend
+from united_help.skill_index import skill_index
+from united_help.skill_tree import add_skill, add_parents, recompute_subtree, invalidate_tree
+from united_help.spatial import invalidate_cluster_tiles
+from united_help.topics import after_commit, follow, unfollow
+
+
+@receiver([post_save, post_delete], sender=City)
+def city_changed(sender, **kwargs):
+    invalidate_city_index()
+
+
+@receiver([post_save, post_delete], sender=Event)
+def event_changed(sender, instance, **kwargs):
+    invalidate_cluster_tiles(instance.geohash, getattr(instance, 'loaded_geohash', ''))
+    instance.loaded_geohash = instance.geohash
+
+
+@receiver(post_save, sender=Event)
+def event_saved_search(sender, instance, **kwargs):
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted_search(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(m2m_changed, sender=Event.skills.through)
+def event_skills_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        skill_ids, event_ids = (pk_set, [instance.pk]) if not reverse else ([instance.pk], pk_set)
+        if action == 'post_add':
+            skill_index.add(skill_ids, event_ids)
+        else:
+            skill_index.remove(skill_ids, event_ids)
+    elif action == 'post_clear':
+        skill_index.changed()
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted_skills(sender, instance, **kwargs):
+    skill_index.remove_event(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Skill)
+def skill_changed(sender, **kwargs):
+    skill_index.changed()
+
+
+@receiver(post_save, sender=Skill)
+def skill_saved_tree(sender, instance, created, **kwargs):
+    if created:
+        add_skill(instance.pk)
+    else:
+        invalidate_tree()
+
+
+@receiver(pre_delete, sender=Skill)
+def skill_deleting_tree(sender, instance, **kwargs):
+    instance.closure_children = list(instance.children.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Skill)
+def skill_deleted_tree(sender, instance, **kwargs):
+    # paths which went through deleted skill are gone
+    for child_id in getattr(instance, 'closure_children', []):
+        recompute_subtree(child_id)
+    invalidate_tree()
+
+
+@receiver(m2m_changed, sender=Skill.parents.through)
+def skill_parents_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add':
+        if not reverse:
+            add_parents(instance.pk, pk_set)
+        else:
+            for child_id in pk_set:
+                add_parents(child_id, [instance.pk])
+    elif action == 'post_remove':
+        for child_id in ([instance.pk] if not reverse else pk_set):
+            recompute_subtree(child_id)
+    elif action == 'pre_clear' and reverse:
+        instance.closure_children = list(instance.children.values_list('id', flat=True))
+    elif action == 'post_clear':
+        for child_id in ([instance.pk] if not reverse else getattr(instance, 'closure_children', [])):
+            recompute_subtree(child_id)
+
+
+@receiver(post_save, sender=Voting)
+def vote_saved(sender, instance, created, **kwargs):
+    if created:
+        vote_added(instance)
+    elif (loaded := getattr(instance, 'loaded_vote', None)) and loaded != (instance.applicant_id, instance.score):
+        applicant_id, score = loaded
+        change_rating(applicant_id, -1, -int(score))
+        vote_added(instance)
+    instance.loaded_vote = (instance.applicant_id, instance.score)
+
+
+@receiver(post_delete, sender=Voting)
+def vote_deleted(sender, instance, **kwargs):
+    vote_removed(instance)
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+def event_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # pk_set of add holds only new rows, removed rows are recounted
+    if action == 'post_add':
+        add_participants(pk_set if reverse else [instance.pk], 1 if reverse else len(pk_set))
+    elif action == 'post_remove':
+        recount_participants(pk_set if reverse else [instance.pk])
+    elif action == 'pre_clear' and reverse:
+        instance.cleared_event_ids = list(instance.user_profiles.values_list('id', flat=True))
+    elif action == 'post_clear':
+        recount_participants(getattr(instance, 'cleared_event_ids', []) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        add_comments(instance.event_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    add_comments(instance.event_id, -1)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_roles(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def user_following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # devices of user are subscribed to fcm topics of organizers it follows
+    if action in ('post_add', 'post_remove'):
+        change = follow if action == 'post_add' else unfollow
+        if not reverse:
+            after_commit(DeviceToken.objects.filter(user_id=instance.pk), change, instance.pk, list(pk_set))
+        else:
+            for user_id in pk_set:
+                after_commit(DeviceToken.objects.filter(user_id=user_id), change, user_id, [instance.pk])
+    elif action == 'pre_clear':
+        # followed profiles of user or followers of profile, both sides are named following
+        instance.cleared_following = list(instance.following.values_list('id', flat=True))
+    elif action == 'post_clear':
+        cleared = getattr(instance, 'cleared_following', [])
+        if not reverse:
+            after_commit(DeviceToken.objects.filter(user_id=instance.pk), unfollow, instance.pk, cleared)
+        else:
+            for user_id in cleared:
+                after_commit(DeviceToken.objects.filter(user_id=user_id), unfollow, user_id, [instance.pk])
@@ -0,0 +1,212 @@
+import time
+from collections import defaultdict
+from functools import reduce
+from threading import Lock, Thread
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from united_help.counters import next_shared_value, shared_value
+from united_help.models import Event, Skill
+from united_help.settings import SKILL_INDEX_CHECK_INTERVAL
+
+
+# versions are taken from db counter, versions kept in cache could be given twice by its non atomic incr
+VERSION_COUNTER = 'skill_index'
+# changes are shared as deltas, worker which is behind more than their ttl rebuilds its index
+DELTA_TTL = 60 * 60
+
+
+def delta_key(version: int) -> str:
+    return f'skill_index:delta:{version}'
+
+
+def bump_version() -> int:
+    '''
+    tell other workers that their skill indexes are stale
+    '''
+    return next_shared_value(VERSION_COUNTER)
+
+
+def bitset_ids(bits: int) -> list[int]:
+    # lowest set bit is taken off one by one, so cost depends on number of found events and not on max id
+    ids = []
+    while bits:
+        low = bits & -bits
+        ids.append(low.bit_length() - 1)
+        bits ^= low
+    return ids
+
+
+def ids_bitset(ids: Iterable[int]) -> int:
+    bits = 0
+    for i in ids:
+        bits |= 1 << i
+    return bits
+
+
+class SkillIndex:
+    '''
+    inverted index skill id -> bitset of event ids and skill name -> id,
+    every committed change gets shared version and its delta is kept in cache,
+    other workers apply deltas and rebuild in background thread only when deltas are lost or change is not a delta
+    '''
+    def __init__(self):
+        self.events: dict[int, int] = defaultdict(int)
+        self.names: dict[str, int] = {}
+        self.version: Optional[int] = None
+        self.checked = 0.0
+        self.loaded = False
+        # version whose delta was not in cache at last check, it is published right after version is taken
+        self.missing: Optional[int] = None
+        self.rebuilding = False
+        self._lock = Lock()
+
+    @staticmethod
+    def load() -> tuple[dict[int, int], dict[str, int]]:
+        events = defaultdict(int)
+        for event_id, skill_id in Event.skills.through.objects.values_list('event_id', 'skill_id'):
+            events[skill_id] |= 1 << event_id
+        names = {}
+        for skill_id, name in Skill.objects.order_by('id').values_list('id', 'name'):
+            names.setdefault(name, skill_id)
+        return events, names
+
+    def rebuild(self):
+        # version is read first, deltas committed meanwhile are applied again and give the same index
+        version = shared_value(VERSION_COUNTER)
+        events, names = self.load()
+        with self._lock:
+            self.events, self.names, self.version = events, names, version
+            self.loaded = True
+            self.missing = None
+
+    def rebuild_later(self):
+        '''
+        requests are served by current index while it is rebuilt
+        '''
+        if self.rebuilding:
+            return
+        self.rebuilding = True
+
+        def run():
+            try:
+                self.rebuild()
+            finally:
+                self.rebuilding = False
+                connection.close()
+        Thread(target=run, daemon=True).start()
+
+    def apply(self, op: str, skill_ids: list[int], event_ids: list[int]):
+        bits = ids_bitset(event_ids)
+        if op == 'add':
+            for skill_id in skill_ids:
+                self.events[skill_id] |= bits
+        elif op == 'remove':
+            for skill_id in skill_ids:
+                self.events[skill_id] &= ~bits
+        elif op == 'remove_event':
+            for skill_id in self.events:
+                self.events[skill_id] &= ~bits
+
+    def catch_up(self, version: int) -> bool:
+        '''
+        apply deltas of other workers, false if index has to be rebuilt
+        '''
+        if version < self.version:
+            # counter row was reset
+            return False
+        versions = range(self.version + 1, version + 1)
+        deltas = cache.get_many([delta_key(v) for v in versions])
+        for v in versions:
+            delta = deltas.get(delta_key(v))
+            if delta is None:
+                if self.missing == v:
+                    return False
+                self.missing = v
+                return True
+            if delta[0] == 'rebuild':
+                return False
+            self.apply(*delta)
+            self.version = v
+        self.missing = None
+        return True
+
+    def ensure_current(self):
+        with self._lock:
+            if self.loaded and time.monotonic() - self.checked < SKILL_INDEX_CHECK_INTERVAL:
+                return
+            self.checked = time.monotonic()
+            if self.loaded:
+                version = shared_value(VERSION_COUNTER)
+                if version != self.version and not self.catch_up(version):
+                    self.rebuild_later()
+                return
+        # first use in this worker, there is nothing to serve meanwhile
+        self.rebuild()
+
+    def publish(self, op: str, skill_ids: Iterable[int] = (), event_ids: Iterable[int] = ()):
+        '''
+        after commit give change shared version and keep its delta for other workers,
+        this worker applies it at once when it has every earlier change
+        '''
+        delta = (op, list(skill_ids), list(event_ids))
+
+        def run():
+            version = bump_version()
+            cache.set(delta_key(version), delta, DELTA_TTL)
+            with self._lock:
+                if not self.loaded or self.version != version - 1:
+                    # earlier changes of other workers come with next check
+                    return
+                if op == 'rebuild':
+                    self.checked = 0.0
+                else:
+                    self.apply(*delta)
+                    self.version = version
+            if op == 'rebuild':
+                self.rebuild_later()
+        transaction.on_commit(run)
+
+    def changed(self):
+        '''
+        change which is not a delta of bitsets, every worker rebuilds its index
+        '''
+        self.publish('rebuild')
+
+    def add(self, skill_ids: Iterable[int], event_ids: Iterable[int]):
+        self.publish('add', skill_ids, event_ids)
+
+    def remove(self, skill_ids: Iterable[int], event_ids: Iterable[int]):
+        self.publish('remove', skill_ids, event_ids)
+
+    def remove_event(self, event_id: int):
+        self.publish('remove_event', event_ids=[event_id])
+
+    def skill_ids(self, names: Iterable[str]) -> list[int]:
+        names = [name for name in names if name]
+        if not names:
+            # events are not filtered by skills, index is not needed
+            return []
+        self.ensure_current()
+        return [self.names[name] for name in names if name in self.names]
+
+    def _events_with_any(self, skill_ids: Iterable[int]) -> int:
+        return reduce(lambda a, b: a | b, (self.events.get(i, 0) for i in skill_ids), 0)
+
+    def events_with_all(self, skill_groups: list[Iterable[int]]) -> list[int]:
+        '''
+        return events which have at least one skill of every group
+        '''
+        if not skill_groups:
+            return []
+        self.ensure_current()
+        return bitset_ids(reduce(lambda a, b: a & b, (self._events_with_any(group) for group in skill_groups)))
+
+    def events_with_any(self, skill_ids: Iterable[int]) -> list[int]:
+        self.ensure_current()
+        return bitset_ids(self._events_with_any(skill_ids))
+
+
+skill_index = SkillIndex()
@@ -0,0 +1,119 @@
+from collections import defaultdict
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+from united_help.helpers import closure_rows
+from united_help.models import Skill, SkillClosure
+
+
+TREE_CACHE_KEY = 'skills:tree'
+
+
+def _parent_edges() -> list[tuple[int, int]]:
+    return list(Skill.parents.through.objects.values_list('from_skill_id', 'to_skill_id'))
+
+
+def _write_rows(rows: dict[tuple[int, int], int]):
+    SkillClosure.objects.bulk_create(
+        [SkillClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+         for (ancestor, descendant), depth in rows.items()],
+        batch_size=1000,
+    )
+
+
+@transaction.atomic
+def rebuild_closure():
+    SkillClosure.objects.all().delete()
+    _write_rows(closure_rows(Skill.objects.values_list('id', flat=True), _parent_edges()))
+    invalidate_tree()
+
+
+@transaction.atomic
+def add_skill(skill_id: int):
+    SkillClosure.objects.get_or_create(ancestor_id=skill_id, descendant_id=skill_id, defaults={'depth': 0})
+    invalidate_tree()
+
+
+@transaction.atomic
+def add_parents(child_id: int, parent_ids: Iterable[int]):
+    '''
+    link every ancestor of new parents with every descendant of child
+    '''
+    ancestors = SkillClosure.objects.filter(descendant_id__in=parent_ids).values_list('ancestor_id', 'depth')
+    descendants = list(SkillClosure.objects.filter(ancestor_id=child_id).values_list('descendant_id', 'depth'))
+    rows = {}
+    for ancestor, ancestor_depth in ancestors:
+        for descendant, descendant_depth in descendants:
+            depth = ancestor_depth + descendant_depth + 1
+            rows[(ancestor, descendant)] = min(depth, rows.get((ancestor, descendant), depth))
+
+    existing = SkillClosure.objects.filter(ancestor_id__in={a for a, _ in rows},
+                                           descendant_id__in={d for _, d in rows})
+    for link in existing:
+        key = (link.ancestor_id, link.descendant_id)
+        if key in rows:
+            if rows[key] < link.depth:
+                SkillClosure.objects.filter(pk=link.pk).update(depth=rows[key])
+            del rows[key]
+    _write_rows(rows)
+    invalidate_tree()
+
+
+@transaction.atomic
+def recompute_subtree(skill_id: int):
+    '''
+    rewrite ancestors of skill and of its descendants after some of their parents were removed
+    '''
+    subtree = list(SkillClosure.objects.filter(ancestor_id=skill_id).values_list('descendant_id', flat=True)) or [skill_id]
+    SkillClosure.objects.filter(descendant_id__in=subtree).delete()
+    _write_rows(closure_rows(subtree, _parent_edges()))
+    invalidate_tree()
+
+
+def would_create_cycle(child_id: int, parent_id: int) -> bool:
+    return child_id == parent_id or SkillClosure.objects.filter(ancestor_id=child_id, descendant_id=parent_id).exists()
+
+
+def descendant_ids(skill_ids: Iterable[int]) -> dict[int, set[int]]:
+    '''
+    return {skill: skill with all its descendants}
+    '''
+    descendants = {skill_id: {skill_id} for skill_id in skill_ids}
+    links = SkillClosure.objects.filter(ancestor_id__in=descendants).values_list('ancestor_id', 'descendant_id')
+    for ancestor, descendant in links:
+        descendants[ancestor].add(descendant)
+    return descendants
+
+
+def invalidate_tree():
+    cache.delete(TREE_CACHE_KEY)
+
+
+def build_tree() -> list[dict]:
+    names = dict(Skill.objects.order_by('id').values_list('id', 'name'))
+    children = defaultdict(list)
+    has_parent = set()
+    for child, parent in sorted(_parent_edges()):
+        children[parent].append(child)
+        has_parent.add(child)
+
+    def node(skill_id: int, path: frozenset) -> dict:
+        # skills with several parents are shown under each of them
+        path = path | {skill_id}
+        return {
+            'id': skill_id,
+            'name': names[skill_id],
+            'children': [node(child, path) for child in children[skill_id] if child not in path],
+        }
+
+    return [node(skill_id, frozenset()) for skill_id in names if skill_id not in has_parent]
+
+
+def get_tree() -> list[dict]:
+    tree = cache.get(TREE_CACHE_KEY)
+    if tree is None:
+        tree = build_tree()
+        cache.set(TREE_CACHE_KEY, tree, timeout=None)
+    return tree
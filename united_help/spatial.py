@@ -0,0 +1,175 @@
+import math
+
+from django.core.cache import cache
+from django.db.models import Q, QuerySet, Count, Avg, Min, Value, FloatField
+from django.db.models.functions import Substr, Sin, Cos, ASin, Sqrt, Radians, Power
+
+from united_help.helpers import geohash_encode, geohash_cell_size, GEOHASH_PRECISION, GEOHASH_END, EARTH_RADIUS_KM
+from united_help.models import Event
+from united_help.settings import EVENT_CLUSTERS_CACHE_TTL, EVENT_CLUSTERS_MAX_TILES
+
+KM_PER_DEGREE = 111.32
+
+
+def geohash_precision_for_radius(lat: float, radius_km: float) -> int:
+    '''
+    return the longest geohash precision whose cell is not smaller than radius,
+    so circle always lies inside of cell with its 8 neighbours
+    '''
+    lon_km = KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01)
+    precision = 0
+    for candidate in range(1, GEOHASH_PRECISION + 1):
+        lat_size, lon_size = geohash_cell_size(candidate)
+        if lat_size * KM_PER_DEGREE < radius_km or lon_size * lon_km < radius_km:
+            break
+        precision = candidate
+    return precision
+
+
+def _steps(start: float, stop: float, step: float):
+    value = start
+    while value < stop + step:
+        yield value
+        value += step
+
+
+def geohash_prefixes(lat: float, lon: float, radius_km: float) -> list[str]:
+    precision = geohash_precision_for_radius(lat, radius_km)
+    prefixes = set()
+    if precision == 0:
+        # circle is wider than the largest cell, take first level cells under its bounding box
+        lat_size, lon_size = geohash_cell_size(1)
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = min(radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01)), 180)
+        for cell_lat in _steps(max(lat - dlat, -90), min(lat + dlat, 90), lat_size):
+            for cell_lon in _steps(lon - dlon, lon + dlon, lon_size):
+                prefixes.add(geohash_encode(min(cell_lat, 90), (cell_lon + 180) % 360 - 180, 1))
+        return sorted(prefixes)
+    lat_size, lon_size = geohash_cell_size(precision)
+    for dlat in (-lat_size, 0, lat_size):
+        for dlon in (-lon_size, 0, lon_size):
+            neighbour_lat = min(max(lat + dlat, -90), 90)
+            neighbour_lon = (lon + dlon + 180) % 360 - 180
+            prefixes.add(geohash_encode(neighbour_lat, neighbour_lon, precision))
+    return sorted(prefixes)
+
+
+def geohash_range_q(prefixes: list[str]) -> Q:
+    q = Q()
+    for prefix in prefixes:
+        q |= Q(geohash__gte=prefix, geohash__lt=prefix + GEOHASH_END)
+    return q
+
+
+def haversine_km_expression(lat: float, lon: float):
+    '''
+    distance from point to event location computed by database
+    '''
+    def half_sin_squared(field: str, value: float):
+        return Power(Sin((Radians(field) - Value(math.radians(value))) / Value(2.0)), Value(2.0))
+
+    a = (half_sin_squared('location_lat', lat) +
+         Value(math.cos(math.radians(lat))) * Cos(Radians('location_lat')) * half_sin_squared('location_lon', lon))
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a), output_field=FloatField())
+
+
+def events_within(queryset: QuerySet, lat: float, lon: float, radius_km: float) -> QuerySet:
+    '''
+    events inside of circle with distance_km sorted by distance,
+    candidates come from geohash index range scan, distance is computed and sorted in the same query
+    '''
+    queryset = queryset.exclude(geohash='').filter(geohash_range_q(geohash_prefixes(lat, lon, radius_km)))
+    return queryset.annotate(distance_km=haversine_km_expression(lat, lon)).filter(
+        distance_km__lte=radius_km).order_by('distance_km', 'id')
+
+
+# map zoom level to geohash precision of clusters, the last matching zoom wins
+ZOOM_PRECISION = ((0, 1), (3, 2), (5, 3), (7, 4), (10, 5), (12, 6), (15, 7))
+CLUSTER_MAX_PRECISION = ZOOM_PRECISION[-1][1]
+
+
+def zoom_to_precision(zoom: int) -> int:
+    precision = ZOOM_PRECISION[0][1]
+    for min_zoom, zoom_precision in ZOOM_PRECISION:
+        if zoom >= min_zoom:
+            precision = zoom_precision
+    return precision
+
+
+def tile_precision(precision: int) -> int:
+    # every tile holds up to 32 * 32 clusters
+    return max(precision - 2, 1)
+
+
+def count_tiles(bbox: tuple[float, float, float, float], precision: int) -> int:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lat_size, lon_size = geohash_cell_size(precision)
+    return (math.ceil((max_lat - min_lat) / lat_size) + 1) * (math.ceil((max_lon - min_lon) / lon_size) + 1)
+
+
+def geohash_tiles(bbox: tuple[float, float, float, float], precision: int) -> set[str]:
+    '''
+    return geohash cells of precision which cover bbox (min_lon, min_lat, max_lon, max_lat)
+    '''
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lat_size, lon_size = geohash_cell_size(precision)
+    tiles = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            tiles.add(geohash_encode(lat, lon, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + lon_size, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + lat_size, max_lat)
+    return tiles
+
+
+def cluster_cache_key(precision: int, tile: str) -> str:
+    return f'events:clusters:{precision}:{tile}'
+
+
+def tile_clusters(precision: int, tile: str) -> list[dict]:
+    key = cluster_cache_key(precision, tile)
+    clusters = cache.get(key)
+    if clusters is None:
+        clusters = list(
+            Event.objects.filter(active=True, geohash__gte=tile, geohash__lt=tile + GEOHASH_END)
+            .annotate(cell=Substr('geohash', 1, precision))
+            .values('cell')
+            .annotate(count=Count('id'), lat=Avg('location_lat'), lon=Avg('location_lon'), event_id=Min('id'))
+            .order_by('cell')
+        )
+        cache.set(key, clusters, EVENT_CLUSTERS_CACHE_TTL)
+    return clusters
+
+
+def event_clusters(bbox: tuple[float, float, float, float], zoom: int) -> tuple[int, list[dict]]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    precision = zoom_to_precision(zoom)
+    tiles_precision = tile_precision(precision)
+    while tiles_precision > 1 and count_tiles(bbox, tiles_precision) > EVENT_CLUSTERS_MAX_TILES:
+        tiles_precision -= 1
+
+    clusters = []
+    for tile in sorted(geohash_tiles(bbox, tiles_precision)):
+        for cluster in tile_clusters(precision, tile):
+            if min_lat <= cluster['lat'] <= max_lat and min_lon <= cluster['lon'] <= max_lon:
+                clusters.append(cluster)
+    return precision, clusters
+
+
+def invalidate_cluster_tiles(*geohashes: str):
+    keys = set()
+    for geohash in geohashes:
+        if not geohash:
+            continue
+        for precision in range(1, CLUSTER_MAX_PRECISION + 1):
+            # tiles could be coarser than usual when viewport is large
+            for tiles_precision in range(1, tile_precision(precision) + 1):
+                keys.add(cluster_cache_key(precision, geohash[:tiles_precision]))
+    if keys:
+        cache.delete_many(list(keys))
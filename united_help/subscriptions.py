@@ -0,0 +1,158 @@
+from typing import Optional
+
+from django.core import checks
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+
+from united_help.models import Event, WaitlistEntry
+
+
+class EventFull(Exception):
+    pass
+
+
+class AlreadySubscribed(Exception):
+    pass
+
+
+class EventNotFull(Exception):
+    pass
+
+
+Participation = Event.participants.through
+
+# UPDATE ... RETURNING of sqlite
+SQLITE_RETURNING_VERSION = (3, 35, 0)
+
+
+def check_returning(app_configs=None, **kwargs) -> list:
+    '''
+    system check, subscriptions take places by UPDATE ... RETURNING
+    '''
+    if connection.vendor == 'sqlite' and connection.Database.sqlite_version_info < SQLITE_RETURNING_VERSION:
+        return [checks.Error(
+            f'sqlite {connection.Database.sqlite_version} has no UPDATE ... RETURNING, '
+            f'event subscriptions need sqlite 3.35 or newer',
+            id='united_help.E001',
+        )]
+    if connection.vendor == 'mysql':
+        return [checks.Error('mysql has no UPDATE ... RETURNING, event subscriptions need sqlite or postgresql',
+                             id='united_help.E001')]
+    return []
+
+
+def _change_participants_count(event_id: int, delta: int, check_capacity: bool = False) -> Optional[int]:
+    '''
+    one UPDATE ... RETURNING, the row stays locked till the end of transaction so capacity can not be exceeded
+    '''
+    capacity = ' AND active AND participants_count < required_members' if check_capacity else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {Event._meta.db_table} SET participants_count = participants_count + %s '
+            f'WHERE id = %s{capacity} RETURNING participants_count',
+            [delta, event_id],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def subscribe(event_id: int, profile_id: int) -> int:
+    '''
+    take a free place of event and add profile to participants, return new participants count,
+    through row is inserted directly so participants signal does not count it twice
+    '''
+    try:
+        with transaction.atomic():
+            participants_count = _change_participants_count(event_id, 1, check_capacity=True)
+            if participants_count is None:
+                raise EventFull
+            Participation.objects.create(event_id=event_id, profile_id=profile_id)
+            leave_waitlist(event_id, profile_id)
+    except IntegrityError:
+        raise AlreadySubscribed
+    return participants_count
+
+
+def unsubscribe(event_id: int, profile_id: int) -> Optional[int]:
+    '''
+    return new participants count or None if profile was not a participant
+    '''
+    with transaction.atomic():
+        deleted, _ = Participation.objects.filter(event_id=event_id, profile_id=profile_id).delete()
+        if not deleted:
+            return None
+        return _change_participants_count(event_id, -1)
+
+
+def waitlist_position(entry: WaitlistEntry) -> int:
+    '''
+    1-based place in queue, positions are dense from waitlist_head so it is one subtraction
+    '''
+    return entry.position - entry.event.waitlist_head
+
+
+def join_waitlist(event_id: int, profile_id: int) -> WaitlistEntry:
+    '''
+    put profile at the end of waitlist of full event, joining twice keeps the first position
+    '''
+    try:
+        with transaction.atomic():
+            # lock of event row orders joins with subscriptions and promotions, so checks below see committed joins
+            Event.objects.select_for_update().values_list('id', flat=True).filter(pk=event_id).first()
+            if entry := WaitlistEntry.objects.filter(event_id=event_id, profile_id=profile_id).first():
+                return entry
+            if Participation.objects.filter(event_id=event_id, profile_id=profile_id).exists():
+                raise AlreadySubscribed
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {Event._meta.db_table} SET waitlist_seq = waitlist_seq + 1 '
+                    f'WHERE id = %s AND participants_count >= required_members RETURNING waitlist_seq',
+                    [event_id],
+                )
+                row = cursor.fetchone()
+            if row is None:
+                raise EventNotFull
+            return WaitlistEntry.objects.create(event_id=event_id, profile_id=profile_id, position=row[0])
+    except IntegrityError:
+        # sqlite has no row locks, concurrent join of the same profile won and its position is kept
+        return WaitlistEntry.objects.get(event_id=event_id, profile_id=profile_id)
+
+
+def leave_waitlist(event_id: int, profile_id: int) -> bool:
+    '''
+    head of queue moves waitlist_head, entry from the middle moves later entries one place up
+    '''
+    with transaction.atomic():
+        # lock of event row orders changes of its queue
+        head = Event.objects.select_for_update().values_list('waitlist_head', flat=True).filter(pk=event_id).first()
+        entry = WaitlistEntry.objects.filter(event_id=event_id, profile_id=profile_id).first()
+        if head is None or entry is None:
+            return False
+        entry.delete()
+        if entry.position == head + 1:
+            Event.objects.filter(pk=event_id).update(waitlist_head=F('waitlist_head') + 1)
+        else:
+            WaitlistEntry.objects.filter(event_id=event_id, position__gt=entry.position).update(
+                position=F('position') - 1)
+            Event.objects.filter(pk=event_id).update(waitlist_seq=F('waitlist_seq') - 1)
+    return True
+
+
+def promote_waitlist(event_id: int) -> list[int]:
+    '''
+    move first active profiles of waitlist to participants while event has free places,
+    return ids of promoted profiles
+    '''
+    promoted = []
+    waiting = WaitlistEntry.objects.filter(event_id=event_id, profile__active=True).order_by('position')
+    with transaction.atomic():
+        while (entry := waiting.first()) is not None:
+            try:
+                subscribe(event_id, entry.profile_id)
+            except EventFull:
+                break
+            except AlreadySubscribed:
+                leave_waitlist(event_id, entry.profile_id)
+            else:
+                promoted.append(entry.profile_id)
+    return promoted
@@ -1,4 +1,5 @@
 import datetime
+from typing import Optional
 
 from django.db.models import Q
 from django.utils.timezone import make_aware
@@ -8,8 +9,11 @@ from datetime import date
 
 
 
-from united_help.services import send_firebase_multiple_messages
-from united_help.settings import BASE_URL
+from united_help import geocode_cache
+from united_help.outbox import enqueue_notification, deliver_outbox
+from united_help.services import geocode_event
+from united_help.settings import BASE_URL, GEOCODE_BATCH_SIZE
+from united_help.topics import reconcile_topics, sync_dirty_tokens
 from united_help.views import finish_event
 #
 #
@@ -33,10 +37,10 @@ def event_start_tomorrow():
         Q(active=True) & Q(start_time__range=(tomorrow, after_tomorrow))
     )
     for event in events:
-        send_firebase_multiple_messages(
+        enqueue_notification(
             f'Event {event.name} by {event.owner.organization} started tomorrow',
             f'Event planned from {event.start_time} to {event.end_time}',
-            [participant.user for participant in event.participants],
+            event.participants.values_list('user_id', flat=True),
             notify_type='start',
             to_profile=Profile.Roles.labels[event.to].capitalize(),
             event_id=event.id,
@@ -45,7 +49,7 @@ def event_start_tomorrow():
             actor_name=event.owner.user.username,
             actor_profile_id=event.owner.id,
         )
-        send_firebase_multiple_messages(
+        enqueue_notification(
             f'Your event {event.name} started tomorrow',
             f'Event planned from {event.start_time} to {event.end_time}',
             [event.owner.user],
@@ -69,3 +73,62 @@ def event_finished():
     )
     for event in events:
         finish_event(event, event_url=f'{BASE_URL}{event.image.url}')
+
+
+def geocode_pending_page(after_id: int = 0, batch_size: int = GEOCODE_BATCH_SIZE) -> tuple[int, Optional[int]]:
+    '''
+    geocode pending events with id greater than after_id, return (resolved, last id of page),
+    last id is None when there are no more pending events
+    '''
+    events = list(Event.objects.filter(geocode_pending=True, id__gt=after_id).select_related('city')
+                  .order_by('id')[:batch_size])
+    resolved = 0
+    for event in events:
+        if geocode_event(event):
+            resolved += 1
+    return resolved, events[-1].id if events else None
+
+
+# events which can not be resolved must not block the rest, every run continues after the last page
+_geocode_after_id = 0
+
+
+# @shared_task
+def geocode_pending_events(batch_size: int = GEOCODE_BATCH_SIZE) -> int:
+    global _geocode_after_id
+    resolved, last_id = geocode_pending_page(_geocode_after_id, batch_size)
+    if last_id is None and _geocode_after_id:
+        # end of pending events, start again from the first one
+        resolved, last_id = geocode_pending_page(0, batch_size)
+    _geocode_after_id = last_id or 0
+    if resolved:
+        print(f'geocode_pending_events {resolved=}')
+    return resolved
+
+
+# @shared_task
+def deliver_notifications():
+    sent = deliver_outbox()
+    if sent:
+        print(f'deliver_notifications {sent=}')
+
+
+# @shared_task
+def reconcile_topic_subscriptions():
+    missing, stale = reconcile_topics()
+    if missing or stale:
+        print(f'reconcile_topic_subscriptions {missing=} {stale=}')
+
+
+# @shared_task
+def sync_topic_tokens():
+    synced = sync_dirty_tokens()
+    if synced:
+        print(f'sync_topic_tokens {synced=}')
+
+
+# @shared_task
+def evict_geocode_cache():
+    evicted = geocode_cache.evict()
+    if evicted:
+        print(f'evict_geocode_cache {evicted=}')
@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.db import connection, connections, OperationalError
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from united_help.models import City, Event, Profile, Skill, User
+from united_help.subscriptions import subscribe, EventFull, AlreadySubscribed
+
+
+def make_profile(username: str, role: int) -> Profile:
+    user = User.objects.create_user(username=username)
+    return Profile.objects.create(user=user, role=role)
+
+
+def make_event(owner: Profile, city: City, **kwargs) -> Event:
+    return Event.objects.create(**{
+        'name': 'Event',
+        'description': 'Description',
+        'city': city,
+        'location': 'Center',
+        'employment': Event.Employments.one_time,
+        'owner': owner,
+        'required_members': 10,
+        'image': 'user_images/event.png',
+        **kwargs,
+    })
+
+
+@mock.patch('united_help.roles.ROLE_CACHE_CHECK_INTERVAL', 60)
+class EventsQueryCountTest(APITestCase):
+    '''
+    page of /events/ costs the same number of queries whatever its size
+    '''
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(city='Kyiv', alias='kyiv')
+        organizer = make_profile('organizer', Profile.Roles.organizer)
+        cls.volunteer = make_profile('volunteer', Profile.Roles.volunteer)
+        skills = [Skill.objects.create(name=f'skill {i}') for i in range(3)]
+        for i in range(30):
+            event = make_event(organizer, city, name=f'Event {i}')
+            event.skills.add(*skills[:i % 4])
+            if i % 2:
+                event.participants.add(cls.volunteer)
+
+    def setUp(self):
+        self.client.force_authenticate(self.volunteer.user)
+
+    def count_queries(self, limit: int) -> int:
+        # first request warms role, skill and url caches, second one is counted
+        self.client.get('/events/', {'limit': limit})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/events/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        queries = self.count_queries(5)
+        self.client.get('/events/', {'limit': 25})
+        with self.assertNumQueries(queries):
+            response = self.client.get('/events/', {'limit': 25})
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_is_subscribe_is_annotated(self):
+        response = self.client.get('/events/', {'limit': 30})
+        subscribed = {event['name'] for event in response.data['results'] if event['is_subscribe']}
+        self.assertEqual(subscribed, {f'Event {i}' for i in range(30) if i % 2})
+
+
+class ConcurrentSubscribeTest(TransactionTestCase):
+    '''
+    parallel subscribes never take more places than event has
+    '''
+    volunteers = 300
+    required_members = 20
+    # retries of subscribe which found database locked
+    attempts = 50
+    backoff = 0.01
+
+    def setUp(self):
+        city = City.objects.create(city='Kyiv', alias='kyiv')
+        organizer = make_profile('organizer', Profile.Roles.organizer)
+        self.event = make_event(organizer, city, required_members=self.required_members)
+        self.profile_ids = [make_profile(f'volunteer {i}', Profile.Roles.volunteer).id
+                            for i in range(self.volunteers)]
+
+    def try_subscribe(self, profile_id: int) -> bool:
+        try:
+            for attempt in range(self.attempts):
+                try:
+                    subscribe(self.event.id, profile_id)
+                    return True
+                except OperationalError:
+                    # sqlite answers concurrent writer with locked table, writer tries again a bit later
+                    time.sleep(self.backoff * (attempt + 1))
+                except (EventFull, AlreadySubscribed):
+                    return False
+            self.fail(f'profile {profile_id} could not subscribe in {self.attempts} attempts, database stays locked')
+        finally:
+            connections.close_all()
+
+    @skipUnlessDBFeature('can_return_columns_from_insert')
+    def test_participants_do_not_exceed_required_members(self):
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            subscribed = sum(executor.map(self.try_subscribe, self.profile_ids))
+        self.event.refresh_from_db()
+        self.assertEqual(subscribed, self.required_members)
+        self.assertEqual(self.event.participants_count, self.required_members)
+        self.assertEqual(self.event.participants.count(), self.required_members)
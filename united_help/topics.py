@@ -0,0 +1,143 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from united_help.fanout import split_batches
+from united_help.fcm import get_messaging
+from united_help.models import DeviceToken, User
+from united_help.settings import TOPIC_SYNC_BATCH_SIZE
+
+# fcm accepts up to 1000 tokens per topic subscribe or unsubscribe call
+TOPIC_BATCH_SIZE = 1000
+# devices checked at once by reconcile_topics
+RECONCILE_CHUNK_SIZE = 1000
+# topic management errors which mean that token will never work again
+DEAD_TOKEN_REASONS = ('registration-token-not-registered', 'invalid-registration-token')
+
+Topics = DeviceToken.topics.through
+
+
+def organizer_topic(profile_id: int) -> str:
+    return f'organizer_{profile_id}'
+
+
+def change_topic(profile_id: int, tokens: list[str], subscribe: bool) -> int:
+    '''
+    subscribe or unsubscribe tokens to topic of organizer in batches and record membership,
+    dead tokens are dropped, return how many tokens were changed
+    '''
+    messaging = get_messaging()
+    call = messaging.subscribe_to_topic if subscribe else messaging.unsubscribe_from_topic
+    topic = organizer_topic(profile_id)
+    changed = 0
+    for batch in split_batches(list(tokens), TOPIC_BATCH_SIZE):
+        response = call(batch, topic)
+        errors = {error.index: error.reason for error in response.errors}
+        dead = [batch[i] for i, reason in errors.items() if reason in DEAD_TOKEN_REASONS]
+        if dead:
+            DeviceToken.objects.filter(token__in=dead).delete()
+        if failed := [batch[i] for i, reason in errors.items() if reason not in DEAD_TOKEN_REASONS]:
+            DeviceToken.objects.filter(token__in=failed).update(topics_dirty=True)
+        done = [token for i, token in enumerate(batch) if i not in errors]
+        device_ids = list(DeviceToken.objects.filter(token__in=done).values_list('id', flat=True))
+        if subscribe:
+            Topics.objects.bulk_create([Topics(devicetoken_id=device_id, profile_id=profile_id)
+                                        for device_id in device_ids], ignore_conflicts=True)
+        else:
+            Topics.objects.filter(devicetoken_id__in=device_ids, profile_id=profile_id).delete()
+        if errors:
+            print(f'[TOPICS] {topic} {len(errors)} tokens failed, {len(dead)} dead')
+        changed += len(done)
+    return changed
+
+
+def follow(user_id: int, profile_ids) -> int:
+    tokens = list(DeviceToken.objects.filter(user_id=user_id).values_list('token', flat=True))
+    if not tokens:
+        return 0
+    return sum(change_topic(profile_id, tokens, subscribe=True) for profile_id in profile_ids)
+
+
+def unfollow(user_id: int, profile_ids) -> int:
+    changed = 0
+    for profile_id in profile_ids:
+        tokens = list(Topics.objects.filter(devicetoken__user_id=user_id, profile_id=profile_id)
+                      .values_list('devicetoken__token', flat=True))
+        if tokens:
+            changed += change_topic(profile_id, tokens, subscribe=False)
+    return changed
+
+
+def sync_token(device: DeviceToken) -> int:
+    '''
+    token follows topics of profiles followed by its user, token moved from other user leaves old topics
+    '''
+    DeviceToken.objects.filter(pk=device.pk).update(topics_dirty=False)
+    wanted = set(User.following.through.objects.filter(user_id=device.user_id).values_list('profile_id', flat=True))
+    current = set(Topics.objects.filter(devicetoken_id=device.pk).values_list('profile_id', flat=True))
+    return (sum(change_topic(profile_id, [device.token], subscribe=True) for profile_id in wanted - current) +
+            sum(change_topic(profile_id, [device.token], subscribe=False) for profile_id in current - wanted))
+
+
+def sync_dirty_tokens(batch_size: int = TOPIC_SYNC_BATCH_SIZE) -> int:
+    '''
+    sync tokens whose topic calls failed, return how many were synced
+    '''
+    synced = 0
+    for device in DeviceToken.objects.filter(topics_dirty=True).order_by('id')[:batch_size]:
+        try:
+            sync_token(device)
+        except Exception as e:
+            DeviceToken.objects.filter(pk=device.pk).update(topics_dirty=True)
+            print(f'[TOPICS] sync of {device} failed: {e!r}')
+        else:
+            synced += 1
+    return synced
+
+
+def after_commit(devices: QuerySet, func, *args):
+    '''
+    fcm is called once the change is committed, devices of failed call are marked for sync_dirty_tokens
+    '''
+    def call():
+        try:
+            func(*args)
+        except Exception as e:
+            devices.update(topics_dirty=True)
+            print(f'[TOPICS] {func.__name__}{args} failed, devices are marked for sync: {e!r}')
+    transaction.on_commit(call)
+
+
+def reconcile_topics(fix: bool = True, chunk_size: int = RECONCILE_CHUNK_SIZE) -> tuple[int, int]:
+    '''
+    compare recorded topic subscriptions with following of token owners chunk by chunk of devices,
+    subscribe missing and unsubscribe stale tokens, return (missing, stale)
+    '''
+    missing_count = stale_count = 0
+    last_id = 0
+    while devices := list(DeviceToken.objects.filter(id__gt=last_id).order_by('id')
+                          .values_list('id', 'token', 'user_id')[:chunk_size]):
+        last_id = devices[-1][0]
+        following = defaultdict(set)
+        for user_id, profile_id in User.following.through.objects.filter(
+                user_id__in={user_id for _, _, user_id in devices}).values_list('user_id', 'profile_id'):
+            following[user_id].add(profile_id)
+        current = defaultdict(set)
+        subscriptions = Topics.objects.filter(devicetoken_id__in=[device_id for device_id, _, _ in devices])
+        for device_id, profile_id in subscriptions.values_list('devicetoken_id', 'profile_id'):
+            current[device_id].add(profile_id)
+        missing, stale = defaultdict(list), defaultdict(list)
+        for device_id, token, user_id in devices:
+            for profile_id in following[user_id] - current[device_id]:
+                missing[profile_id].append(token)
+            for profile_id in current[device_id] - following[user_id]:
+                stale[profile_id].append(token)
+        missing_count += sum(map(len, missing.values()))
+        stale_count += sum(map(len, stale.values()))
+        if fix:
+            for profile_id, tokens in missing.items():
+                change_topic(profile_id, tokens, subscribe=True)
+            for profile_id, tokens in stale.items():
+                change_topic(profile_id, tokens, subscribe=False)
+    return missing_count, stale_count
@@ -12,7 +12,7 @@ from united_help.views import ActivateProfileView, EventSubscribeView, EventUnsu
     MeUserView, MeProfilesView, FinishEventView, CancelEventView, ActivateEventView, EventsCreatedView, \
     EventsAttendedView, EventsFinishedView, CommentsEventView, UserCommentsEventView, ContactsView, \
     UserAddFirebaseTokenView, UserProfileView, ProfileSubscribeView, ProfileUnsubscribeView, RateParticipantsView, \
-    DataDeletionView
+    DataDeletionView, CacheStatsView, NearestCityView, EventClustersView, SkillTreeView, EventWaitlistView
 
 router = routers.SimpleRouter()
 router.register(r'users', views.UserView)
@@ -40,13 +40,16 @@ urlpatterns = [
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('activate-profile/', ActivateProfileView.as_view()),
+    path('stats/caches/', CacheStatsView.as_view()),
 
     path('events/subscribed/', EventsSubscribedView.as_view()),
+    path('events/clusters/', EventClustersView.as_view()),
     path('events/attended/', EventsAttendedView.as_view()),
     path('events/created/', EventsCreatedView.as_view()),
     path('events/finished/', EventsFinishedView.as_view()),
     path('events/<int:pk>/subscribe/', EventSubscribeView.as_view()),
     path('events/<int:pk>/unsubscribe/', EventUnsubscribeView.as_view()),
+    path('events/<int:pk>/waitlist/', EventWaitlistView.as_view()),
     path('events/<int:pk>/cancel/', CancelEventView.as_view()),
     path('events/<int:pk>/activate/', ActivateEventView.as_view()),
     path('events/<int:pk>/finish/', FinishEventView.as_view()),
@@ -62,6 +65,9 @@ urlpatterns = [
     path('profiles/contacts/', ContactsView.as_view()),
     path('userprofile/<str:pk>/', UserProfileView.as_view()),
 
+    path('cities/nearest/', NearestCityView.as_view()),
+    path('skills/tree/', SkillTreeView.as_view()),
+
     path('profiles/<int:pk>/subscribe/', ProfileSubscribeView.as_view()),
     path('profiles/<int:pk>/unsubscribe/', ProfileUnsubscribeView.as_view()),
 
@@ -2,6 +2,7 @@ import base64
 import hashlib
 import hmac
 import json
+import math
 from contextlib import suppress
 from datetime import datetime as dt
 
@@ -14,16 +15,29 @@ from rest_framework.decorators import api_view
 from rest_framework.generics import UpdateAPIView, GenericAPIView, get_object_or_404, ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Case, When, Value, FloatField, Exists, OuterRef
 from rest_framework.exceptions import ValidationError
 
-from united_help import settings
-from united_help.helpers import str_to_bool, index_in_list, DATETIME_FORMAT
+from united_help import settings, geocode_cache
+from united_help.gazetteer import city_centroid, nearest_city
+from united_help.helpers import str_to_bool, index_in_list, filter_by_ids, DATETIME_FORMAT
+from united_help.pagination import OptionalKeysetPaginationMixin, EventKeysetPagination, CommentKeysetPagination, \
+    KeysetPagination, is_cursor_requested
+from united_help.roles import get_roles, get_stats as get_role_stats
 from united_help.permissions import IsOrganizerOrReadOnly, IsAdminOrReadOnly, \
     IsAuthenticatedOrCreateOnly, IsAdmin, IsVolunteer, IsAdminOrOwnerOrCreateOnly, IsOrganizer, IsVolunteerOrRefugee
 from united_help.serializers import *
 from united_help.models import *
-from united_help.services import send_firebase_multiple_messages, get_fine_location
+from united_help.devices import register_token
+from united_help.outbox import enqueue_notification, enqueue_topic_notification, enqueue_coalesced
+from united_help.search import search_events
+from united_help.skill_index import skill_index
+from united_help.skill_tree import descendant_ids, get_tree
+from united_help.spatial import events_within, event_clusters
+from united_help.topics import organizer_topic
+from united_help.subscriptions import subscribe, unsubscribe, EventFull, AlreadySubscribed, EventNotFull, \
+    join_waitlist, leave_waitlist, promote_waitlist
 from united_help.settings import MEDIA_URL, MEDIA_ROOT, BASE_URL
 
 
@@ -33,22 +47,24 @@ def set_base_url(request, event):
         BASE_URL = request.build_absolute_uri(event.image.url).replace(event.image.url, '')
 
 
-class EventsView(viewsets.ModelViewSet):
+def annotate_is_subscribe(queryset, user):
+    '''
+    mark events where user profile of event role is participant
+    '''
+    participation = Event.participants.through.objects.filter(
+        event_id=OuterRef('pk'), profile__user_id=user.id, profile__role=OuterRef('to'))
+    return queryset.annotate(is_subscribe=Exists(participation))
+
+
+class EventsView(OptionalKeysetPaginationMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsOrganizerOrReadOnly]
     serializer_class = EventSerializer
+    keyset_pagination_class = EventKeysetPagination
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-
-        event = None
-        for event in queryset:
-            if not event.location_lat or not event.location_lon:
-                lat, lon, name = get_fine_location(event.city.city, event.location)
-                event.location_lat = lat
-                event.location_lon = lon
-                event.location_display = name
-                event.save()
-        set_base_url(request, event)
+        # coordinates are resolved by geocode worker, list returns whatever is known
+        if (event := self.get_queryset().first()) is not None:
+            set_base_url(request, event)
 
         return super().list(request, *args, **kwargs)
 
@@ -60,25 +76,22 @@ class EventsView(viewsets.ModelViewSet):
         city = self.request.query_params.get('city')
         skills = []
         skills_inclusive = self.request.query_params.get(f'skills_inclusive')
+        skills_descendants = self.request.query_params.get('skills_descendants')
         search_in_description = self.request.query_params.get(f'search_in_description', 'True')
         start_time = self.request.query_params.get(f'start_time')
         end_time = self.request.query_params.get(f'end_time')
+        near = self.request.query_params.get('near')
+        radius_km = self.request.query_params.get('radius_km', str(settings.EVENTS_NEAR_RADIUS_KM))
 
         for i in range(30):
             skills.append(self.request.query_params.get(f'skill{i}'))
-        skill_objs = []
-        for skill in skills:
-            if skill:
-                if (skill_obj := Skill.objects.filter(name=skill)).exists():
-                    skill_objs.append(skill_obj.first())
+        skill_ids = skill_index.skill_ids(skill for skill in skills if skill)
 
         if (bool_active := str_to_bool(active)) is not None:
             queryset = queryset.filter(active=bool_active)
         if name:
-            if str_to_bool(search_in_description):
-                queryset = queryset.filter(Q(name__contains=name) | Q(description__contains=name))
-            else:
-                queryset = queryset.filter(name__contains=name)
+            # ranked by relevance, every word is matched as prefix
+            queryset = search_events(queryset, name, in_description=bool(str_to_bool(search_in_description)))
         if employment:
             print(f'{employment=}')
             employment_int = index_in_list(Event.Employments.names, employment)
@@ -87,11 +100,15 @@ class EventsView(viewsets.ModelViewSet):
                 queryset = queryset.filter(employment=employment_int)
         if city:
             queryset = queryset.filter(city__alias__contains=city)
-        if skill_objs:
+        if skill_ids:
+            if str_to_bool(skills_descendants):
+                skill_groups = list(descendant_ids(skill_ids).values())
+            else:
+                skill_groups = [{skill_id} for skill_id in skill_ids]
             if str_to_bool(skills_inclusive):
-                queryset = queryset.filter(skills__contains=skills)
+                queryset = filter_by_ids(queryset, skill_index.events_with_all(skill_groups))
             else:
-                queryset = queryset.filter(skills__in=skills)
+                queryset = filter_by_ids(queryset, skill_index.events_with_any(set().union(*skill_groups)))
         if start_time:
             with suppress(ValueError):
                 start_time_dt = dt.strptime(start_time, DATETIME_FORMAT)
@@ -100,43 +117,49 @@ class EventsView(viewsets.ModelViewSet):
             with suppress(ValueError):
                 end_time_dt = dt.strptime(end_time, DATETIME_FORMAT)
                 queryset = queryset.filter(start_time__lte=end_time_dt)
+        if near:
+            try:
+                lat, lon = map(float, near.split(','))
+                radius_km = float(radius_km)
+            except ValueError:
+                raise ValidationError('near should be lat,lon and radius_km a number')
+            if not all(map(math.isfinite, (lat, lon, radius_km))) or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValidationError('near should be lat in [-90, 90] and lon in [-180, 180]')
+            if not 0 < radius_km <= settings.EVENTS_NEAR_MAX_RADIUS_KM:
+                raise ValidationError(f'radius_km should be in (0, {settings.EVENTS_NEAR_MAX_RADIUS_KM}]')
+            queryset = events_within(queryset, lat, lon, radius_km)
         return queryset
 
     def get_queryset(self):
-        queryset = Event.objects.all()
+        # is_subscribe of whole page is one subquery, m2m ids of page are two prefetch queries
+        queryset = annotate_is_subscribe(Event.objects.all(), self.request.user).prefetch_related(
+            'participants', 'skills')
         return self.event_filters(queryset)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         print(f'{serializer.validated_data=}')
-        profiles = Profile.objects.filter(active=True, user=self.request.user)
-        user_organizer_profile = profiles.filter(role=Profile.Roles.organizer)
-        if user_organizer_profile.exists():
-            serializer.validated_data['owner'] = user_organizer_profile.first()
-            if (not serializer.validated_data['location_lat'] or
-                    not serializer.validated_data['location_lon']):
-                lat, lon, name = get_fine_location(serializer.validated_data['city'].city,
-                                                   serializer.validated_data['location'])
+        if (organizer := get_roles(self.request).organizer) is not None:
+            serializer.validated_data['owner'] = organizer
+            if (not serializer.validated_data.get('location_lat') or
+                    not serializer.validated_data.get('location_lon')):
+                # event is placed at city center till geocode worker resolves its location
+                lat, lon, name = city_centroid(serializer.validated_data['city']) or (0, 0, '')
                 serializer.validated_data['location_lat'] = lat
                 serializer.validated_data['location_lon'] = lon
                 serializer.validated_data['location_display'] = name
+                serializer.validated_data['geocode_pending'] = True
             event = serializer.save()
-            if event.owner_profile.following.exists():
-                send_firebase_multiple_messages(
-                    f'Organizer has created event {event.name}',
-                    f'Organizer {event.owner.user.username} has created event {event.name}',
-                    event.owner_profile.following.all(),
-                    image=self.request.build_absolute_uri(event.image.url),
-                    notify_type='change',
-                    to_profile=Profile.Roles.labels[event.to].capitalize(),
-                    event_id=event.id,
-                    event_to=Profile.Roles.labels[event.to].capitalize(),
-                    event_name=event.name,
-                    actor_name=event.owner.user.username,
-                    actor_profile_id=event.owner.id,
-                )
+            notify_event_change(
+                self.request, event,
+                f'Organizer has created event {event.name}',
+                f'Organizer {event.owner.user.username} has created event {event.name}',
+                participants=False,
+            )
         else:
             raise Http404('you are no organizer')
 
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         is_same = True  # check if event is changed
 
@@ -152,13 +175,6 @@ class EventsView(viewsets.ModelViewSet):
         instance_serializer = self.get_serializer(event)
         instance_data = instance_serializer.data
 
-        if (data['location'] != instance_data['location']):
-            lat, lon, name = get_fine_location(serializer.validated_data['city'].city,
-                                               serializer.validated_data['location'])
-            serializer.validated_data['location_lat'] = lat
-            serializer.validated_data['location_lon'] = lon
-            serializer.validated_data['location_display'] = name
-
         update_items = {}
         # update_items_push = {}
         for k in data:
@@ -168,10 +184,11 @@ class EventsView(viewsets.ModelViewSet):
                 # update_items_push[f'msgkey_{k}'] = data[k]
 
         if not is_same:
-            send_firebase_multiple_messages(
-                f'Organizer {event.owner.user.username} changed івент {event.name}.',
-                f'{[f"{k} is {v}" for k, v in update_items.items()]}',
-                [participant.user for participant in event.participants],
+            # edits made one after another reach participants as one push
+            enqueue_coalesced(
+                'change', event.id,
+                event.participants.values_list('user_id', flat=True),
+                {'changes': update_items, 'count': 1},
                 notify_type='change',
                 to_profile=Profile.Roles.labels[event.to].capitalize(),
                 event_id=event_id,
@@ -179,12 +196,21 @@ class EventsView(viewsets.ModelViewSet):
                 event_name=event.name,
                 actor_name=event.owner.user.username,
                 actor_profile_id=event.owner.id,
-                # **update_items_push,
-                _data=json.dumps(update_items),
             )
 
         serializer.is_valid(raise_exception=True)
+        required_members = instance.required_members
+        if (serializer.validated_data.get('location', instance.location) != instance.location and
+                'location_lat' not in request.data and 'location_lon' not in request.data):
+            city = serializer.validated_data.get('city', instance.city)
+            lat, lon, name = city_centroid(city) or (0, 0, '')
+            serializer.validated_data['location_lat'] = lat
+            serializer.validated_data['location_lon'] = lon
+            serializer.validated_data['location_display'] = name
+            serializer.validated_data['geocode_pending'] = True
         self.perform_update(serializer)
+        if instance.required_members > required_members:
+            notify_promoted(request, instance, promote_waitlist(instance.id))
 
         if getattr(instance, '_prefetched_objects_cache', None):
             instance._prefetched_objects_cache = {}
@@ -192,37 +218,57 @@ class EventsView(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class EventsSubscribedView(ListAPIView):
+class EventClustersView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            min_lon, min_lat, max_lon, max_lat = map(float, request.query_params.get('bbox', '').split(','))
+            zoom = int(request.query_params.get('zoom', 0))
+        except ValueError:
+            raise ValidationError('bbox should be min_lon,min_lat,max_lon,max_lat and zoom an integer')
+        if not all(map(math.isfinite, (min_lon, min_lat, max_lon, max_lat))):
+            raise ValidationError('bbox values should be finite numbers')
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValidationError('bbox minimums should not be greater than maximums')
+        bbox = (max(min_lon, -180), max(min_lat, -90), min(max_lon, 180), min(max_lat, 90))
+
+        precision, clusters = event_clusters(bbox, zoom)
+        return Response({
+            'precision': precision,
+            'clusters': [{'geohash': cluster['cell'], 'count': cluster['count'], 'lat': cluster['lat'],
+                          'lon': cluster['lon'], 'event_id': cluster['event_id']} for cluster in clusters],
+        })
+
+
+class EventsSubscribedView(OptionalKeysetPaginationMixin, ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsVolunteer]
     serializer_class = EventSubscribeSerializer
+    keyset_pagination_class = EventKeysetPagination
     queryset = Event.objects.all()
 
     def get_queryset(self):
-        profiles = Profile.objects.filter(active=True, user=self.request.user)
-        user_volunteer_profile = profiles.filter(role=Profile.Roles.volunteer)
-        if user_volunteer_profile.exists():
-            events = self.queryset.filter(participants__in=user_volunteer_profile)
+        if (volunteer := get_roles(self.request).volunteer) is not None:
+            events = self.queryset.filter(participants=volunteer)
 
             return events
         return self.queryset.filter(id=-1)
 
 
-class EventsAttendedView(ListAPIView):
+class EventsAttendedView(OptionalKeysetPaginationMixin, ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsVolunteer]
     serializer_class = EventSubscribeSerializer
+    keyset_pagination_class = EventKeysetPagination
     queryset = EventLog.objects.all()
 
     def get_queryset(self):
-        profiles = Profile.objects.filter(active=True, user=self.request.user)
-        user_volunteer_profile = profiles.filter(role=Profile.Roles.volunteer)
-        if user_volunteer_profile.exists():
-            event_logs = self.queryset.filter(volunteers_attended__in=user_volunteer_profile, happened=True)
-            event_ids = list(set(event_logs.values_list('event_id')))
-            event_ids = [i[0] for i in event_ids]
-            events = Event.objects.filter(pk__in=event_ids)
-            set_base_url(self.request, events.first())
+        if (volunteer := get_roles(self.request).volunteer) is not None:
+            event_logs = self.queryset.filter(event_id=OuterRef('pk'), volunteers_attended=volunteer, happened=True)
+            events = Event.objects.filter(Exists(event_logs)).order_by('start_time', 'id')
+            if (event := events.first()) is not None:
+                set_base_url(self.request, event)
             return events
-        return self.queryset.filter(id=-1)
+        return Event.objects.none()
 
 
 class EventsCreatedView(ListAPIView):
@@ -231,31 +277,28 @@ class EventsCreatedView(ListAPIView):
     queryset = Event.objects.all()
 
     def get_queryset(self):
-        profiles = Profile.objects.filter(active=True, user=self.request.user)
-        owner_profile = profiles.filter(role=Profile.Roles.organizer)
-        if owner_profile.exists():
-            events = self.queryset.filter(owner=owner_profile.first())
+        if (organizer := get_roles(self.request).organizer) is not None:
+            events = self.queryset.filter(owner=organizer)
             set_base_url(self.request, events.first())
             return events
         return self.queryset.filter(id=-1)
 
 
-class EventsFinishedView(ListAPIView):
+class EventsFinishedView(OptionalKeysetPaginationMixin, ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsOrganizer]
     serializer_class = EventFinishedSerializer
+    keyset_pagination_class = EventKeysetPagination
     queryset = EventLog.objects.all()
 
     def get_queryset(self):
-        profiles = Profile.objects.filter(active=True, user=self.request.user)
-        user_organizeer_profile = profiles.filter(role=Profile.Roles.organizer)
-        if user_organizeer_profile.exists():
-            event_logs = self.queryset.filter(event__owner=user_organizeer_profile.first(), happened=True)
-            event_ids = list(set(event_logs.values_list('event_id')))
-            event_ids = [i[0] for i in event_ids]
-            events = Event.objects.filter(pk__in=event_ids)
-            set_base_url(self.request, events.first())
+        if (organizer := get_roles(self.request).organizer) is not None:
+            event_logs = self.queryset.filter(event_id=OuterRef('pk'), happened=True)
+            events = Event.objects.filter(Exists(event_logs), owner=organizer).select_related(
+                'owner').order_by('start_time', 'id')
+            if (event := events.first()) is not None:
+                set_base_url(self.request, event)
             return events
-        return self.queryset.filter(id=-1)
+        return Event.objects.none()
 
 
 class ContactsView(ListAPIView):
@@ -263,14 +306,26 @@ class ContactsView(ListAPIView):
     serializer_class = ContactGetSerializer
     queryset = Profile.objects.all()
 
+    @staticmethod
+    def contacts_queryset(events, role):
+        # participants of given role in any of events, each profile once
+        participation = Event.participants.through.objects.filter(
+            profile_id=OuterRef('pk'), event__in=events, event__to=role)
+        return Profile.objects.filter(Exists(participation), role=role).select_related('user').order_by('id')
+
     def get(self, request, *args, **kwargs):
         volunteers_only = self.request.query_params.get('volunteers')
         refugees_only = self.request.query_params.get('refugees')
         event_id: str = self.request.query_params.get('event_id')
 
+        organizer = get_roles(request).organizer
+        if organizer is None:
+            raise Http404
+        events = Event.objects.filter(owner=organizer)
+
         if event_id is not None and event_id and event_id.isdigit():
-            event_id: int = int(event_id)
-            event = get_object_or_404(Event, id=event_id)
+            event = get_object_or_404(events, id=int(event_id))
+            events = events.filter(id=event.id)
             types = [event.to]
         elif volunteers_only is not None and refugees_only is not None:
             types = [Profile.Roles.volunteer, Profile.Roles.refugee]
@@ -281,50 +336,30 @@ class ContactsView(ListAPIView):
         else:
             types = [Profile.Roles.volunteer, Profile.Roles.refugee]
 
-        user_organizeer_profile = Profile.objects.filter(role=Profile.Roles.organizer)
-
-        volunteers = set()
-        refugees = set()
-        if user_organizeer_profile.exists():
-            if isinstance(event_id, int):
-                if event.to == Profile.Roles.volunteer:
-                    volunteers = set(list(event.participants.all()))
-                else:
-                    refugees = set(list(event.participants.all()))
-            else:
-                events = Event.objects.filter(owner=user_organizeer_profile.first())
-                for event in events:
-                    if event.to == Profile.Roles.volunteer and Profile.Roles.volunteer in types:
-                        for participant in event.participants.all():
-                            volunteers.add(participant)
-                    if event.to == Profile.Roles.refugee and Profile.Roles.refugee in types:
-                        for participant in event.participants.all():
-                            refugees.add(participant)
-        else:
-            raise Http404
-
-        contacts = {}
-        if Profile.Roles.refugee in types:
-            contacts['refugees'] = list(refugees)
-        if Profile.Roles.volunteer in types:
-            contacts['volunteers'] = list(volunteers)
-
         data = {}
-
-        for type_, list_ in contacts.items():
-            page = self.paginate_queryset(list_)
-
-            if page is not None:
-                serializer = self.get_serializer(page, many=True, context={"request": request})
+        for role, type_ in ((Profile.Roles.refugee, 'refugees'), (Profile.Roles.volunteer, 'volunteers')):
+            if role not in types:
+                continue
+            contacts = self.contacts_queryset(events, role)
+            cursor_query_param = f'{type_}_cursor'
+            if is_cursor_requested(request, cursor_query_param):
+                # every role is paged by its own cursor
+                paginator = KeysetPagination(cursor_query_param=cursor_query_param)
+                page = paginator.paginate_queryset(contacts, request, view=self)
+                data[type_] = {
+                    'next': paginator.get_next_link(),
+                    'results': self.get_serializer(page, many=True).data,
+                }
             else:
-                serializer = self.get_serializer(list_, many=True, context={"request": request})
-            data[type_] = serializer.data
+                page = self.paginate_queryset(contacts)
+                data[type_] = self.get_serializer(page if page is not None else contacts, many=True).data
         return Response(data)
 
 
-class CommentsEventView(ListAPIView):
+class CommentsEventView(OptionalKeysetPaginationMixin, ListAPIView):
     permission_classes = [permissions.IsAuthenticated, ]
     serializer_class = CommentSerializer
+    keyset_pagination_class = CommentKeysetPagination
     lookup_field = 'pk'
 
     def get_queryset(self, ):
@@ -345,21 +380,7 @@ class UserAddFirebaseTokenView(APIView):
         token = validated_data['token']
 
         if token:
-            user = User.objects.get(id=request.user.id)
-            firebase_tokens = user.firebase_tokens
-            if firebase_tokens:
-                firebase_tokens = set(user.firebase_tokens.split())
-            else:
-                firebase_tokens = set()
-            firebase_tokens.add(token)
-            new_tokens = ' '.join(list(firebase_tokens))
-            print(f'{firebase_tokens=}')
-            user.firebase_tokens = new_tokens
-            print(f'{new_tokens=}')
-            user.save()
-
-            print(f'{user.firebase_tokens=}')
-
+            register_token(request.user.id, token, validated_data.get('platform', ''))
             message = f'You added new firebase token'
             status_code = 200
         else:
@@ -368,10 +389,11 @@ class UserAddFirebaseTokenView(APIView):
         return Response(message, status=status_code)
 
 
-class UserCommentsEventView(ListAPIView):
+class UserCommentsEventView(OptionalKeysetPaginationMixin, ListAPIView):
     # return comments with user who created this comment
     permission_classes = [permissions.IsAuthenticated, ]
     serializer_class = UserCommentSerializer
+    keyset_pagination_class = CommentKeysetPagination
     lookup_field = 'pk'
 
     def list(self, request, *args, **kwargs):
@@ -396,75 +418,66 @@ class EventSubscribeView(APIView):
     serializer_class = EventSubscribeSerializer
     queryset = Event.objects.all()
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         event_id = int(kwargs.pop('pk'))
-        event = get_object_or_404(Event.objects.filter(active=True), pk=event_id)
+        event = get_object_or_404(Event.objects.filter(active=True).select_related('owner__user'), pk=event_id)
         if event.owner.user.id == request.user.id:
             message = f'Не займайся хуйнею!'
             status_code = 400
             return Response(message, status=status_code)
-        if event.participants.all().count() < event.required_members:
-            profiles = Profile.objects.filter(active=True, user=request.user)
-            user_volunteer_profile = profiles.filter(role=Profile.Roles.volunteer)
-            if user_volunteer_profile.exists():
-                event.participants.add(user_volunteer_profile.first())
-                event_to: str = Profile.Roles.labels[event.to]
-
-                send_firebase_multiple_messages(
-                    f'{event_to.capitalize()} {user_volunteer_profile.first().user.username} приєднується до івента {event.name}.',
-                    f'Набрано {event.participants.count()} з {event.required_members} {event_to}ів для допомоги в організації івента {event.name}.',
-                    [event.owner.user, ],
-                    notify_type='subscribe',
-                    to_profile=Profile.Roles.organizer.name,
-                    event_id=event_id,
-                    event_to=event_to.capitalize(),
-                    image=request.build_absolute_uri(user_volunteer_profile.first().image.url),
-                    event_name=event.name,
-                    actor_name=user_volunteer_profile.first().user.username,
-                    actor_profile_id=user_volunteer_profile.first().id,
-                    # participants=event.participants.count(),
-                    # required=event.required_members,
-                    _data=json.dumps({
-                        'required': event.required_members,
-                        'participants': event.participants.count(),
-                    }),
+        volunteer = get_roles(request).volunteer
+        if volunteer is None:
+            return Response(f'You are not a volunteer', status=403)
+        try:
+            participants_count = subscribe(event.id, volunteer.id)
+        except EventFull:
+            return Response(f'There are no more job for you on this event {event}, join its waitlist', status=400)
+        except AlreadySubscribed:
+            return Response(f'You are already subscribed to event {event}', status=400)
 
-                )
-                message = f'You subscribed to event {event}'
-                status_code = 200
-            else:
-                message = f'You are not a volunteer'
-                status_code = 403
-        else:
-            message = f'There are no more job for you on this event {event}'
-            status_code = 400
-        return Response(message, status=status_code)
+        event_to: str = Profile.Roles.labels[event.to]
+        enqueue_coalesced(
+            'participants', event.id,
+            [event.owner.user, ],
+            {'joined': 1, 'left': 0, 'participants': participants_count, 'required': event.required_members},
+            notify_type='subscribe',
+            to_profile=Profile.Roles.organizer.name,
+            event_id=event_id,
+            event_to=event_to.capitalize(),
+            image=request.build_absolute_uri(volunteer.image.url),
+            event_name=event.name,
+            actor_name=volunteer.user.username,
+            actor_profile_id=volunteer.id,
+        )
+        return Response(f'You subscribed to event {event}', status=200)
 
 
 class EventUnsubscribeView(EventSubscribeView):
     permission_classes = [permissions.IsAuthenticated, IsVolunteer]
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         event_id = kwargs.pop('pk')
         event = get_object_or_404(Event.objects.filter(active=True), pk=event_id)
-        profiles = Profile.objects.filter(active=True, user=request.user)
-        user_volunteer_profile = profiles.filter(role=Profile.Roles.volunteer)
-        if user_volunteer_profile.exists():
-            if event.participants.filter(id=user_volunteer_profile.first().id).exists():
-                event.participants.remove(user_volunteer_profile.first())
-                send_firebase_multiple_messages(
-                    f'You are lost one of volunteers in {event.name}',
-                    f'Volunteer {user_volunteer_profile.first().user.username} unsubscribed to event {event.name}',
+        if (volunteer := get_roles(request).volunteer) is not None:
+            if (participants_count := unsubscribe(event.id, volunteer.id)) is not None:
+                promoted = promote_waitlist(event.id)
+                enqueue_coalesced(
+                    'participants', event.id,
                     [event.owner.user, ],
-                    image=request.build_absolute_uri(user_volunteer_profile.first().image.url),
+                    {'joined': len(promoted), 'left': 1, 'participants': participants_count + len(promoted),
+                     'required': event.required_members},
+                    image=request.build_absolute_uri(volunteer.image.url),
                     notify_type='subscribe',
                     to_profile=Profile.Roles.organizer.name,
                     event_id=event_id,
                     event_to=Profile.Roles.labels[event.to].capitalize(),
                     event_name=event.name,
-                    actor_name=user_volunteer_profile.first().user.username,
-                    actor_profile_id=user_volunteer_profile.first().id,
+                    actor_name=volunteer.user.username,
+                    actor_profile_id=volunteer.id,
                 )
+                notify_promoted(request, event, promoted)
                 message = f'You unsubscribed to event {event}'
                 status_code = 204
             else:
@@ -476,6 +489,77 @@ class EventUnsubscribeView(EventSubscribeView):
         return Response(message, status=status_code)
 
 
+def notify_event_change(request, event, title, message, participants=True):
+    '''
+    followers of organizer get one push through its fcm topic, participants who do not follow it get own pushes
+    '''
+    kwargs = dict(
+        image=request.build_absolute_uri(event.image.url),
+        notify_type='change',
+        to_profile=Profile.Roles.labels[event.to].capitalize(),
+        event_id=event.id,
+        event_to=Profile.Roles.labels[event.to].capitalize(),
+        event_name=event.name,
+        actor_name=event.owner.user.username,
+        actor_profile_id=event.owner.id,
+    )
+    if participants:
+        user_ids = list(event.participants.exclude(user__following=event.owner_id).values_list('user_id', flat=True))
+        if user_ids:
+            enqueue_notification(title, message, user_ids, **kwargs)
+    if event.owner.following.exists():
+        enqueue_topic_notification(organizer_topic(event.owner_id), title, message, **kwargs)
+
+
+def notify_promoted(request, event, profile_ids):
+    for profile in Profile.objects.filter(pk__in=profile_ids).select_related('user'):
+        enqueue_notification(
+            f'You are participant of event {event.name}',
+            f'Place in event {event.name} became free and you are moved from waitlist to participants',
+            [profile.user, ],
+            image=request.build_absolute_uri(event.image.url),
+            notify_type='subscribe',
+            to_profile=Profile.Roles.labels[profile.role].capitalize(),
+            event_id=event.id,
+            event_to=Profile.Roles.labels[event.to].capitalize(),
+            event_name=event.name,
+            actor_name=event.owner.user.username,
+            actor_profile_id=event.owner.id,
+        )
+
+
+class EventWaitlistView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsVolunteer]
+    serializer_class = WaitlistEntrySerializer
+
+    def get_volunteer(self, request):
+        return get_roles(request).volunteer
+
+    def get(self, request, pk):
+        volunteer = self.get_volunteer(request)
+        entry = get_object_or_404(WaitlistEntry.objects.select_related('event'), event_id=pk, profile=volunteer)
+        return Response(self.serializer_class(entry).data)
+
+    def post(self, request, pk):
+        event = get_object_or_404(Event.objects.filter(active=True), pk=pk)
+        if (volunteer := self.get_volunteer(request)) is None:
+            return Response(f'You are not a volunteer', status=403)
+        try:
+            entry = join_waitlist(event.id, volunteer.id)
+        except AlreadySubscribed:
+            return Response(f'You are already subscribed to event {event}', status=400)
+        except EventNotFull:
+            return Response(f'Event {event} has free places, subscribe to it', status=400)
+        return Response(self.serializer_class(entry).data, status=201)
+
+    def delete(self, request, pk):
+        volunteer = self.get_volunteer(request)
+        if volunteer is None or not leave_waitlist(pk, volunteer.id):
+            return Response(f'You are not in waitlist of event {pk}', status=400)
+        return Response(f'You left waitlist of event {pk}', status=204)
+
+
+@transaction.atomic
 def finish_event(event, data=None, serializer=None, request=None, event_url=None):
     if not event.active:
         message = f'You are already finished {event}'
@@ -498,7 +582,7 @@ def finish_event(event, data=None, serializer=None, request=None, event_url=None
             event.save()
         users_to_send = [participant.user for participant in event.participants.all()]
         event_url = event_url or request.build_absolute_uri(event.image.url)
-        send_firebase_multiple_messages(
+        enqueue_notification(
             f'Organizer has finished event {event.name}',
             f'Organizer {event.owner.user.username} has finished event {event.name}',
             list(users_to_send),
@@ -511,7 +595,7 @@ def finish_event(event, data=None, serializer=None, request=None, event_url=None
             actor_name=event.owner.user.username,
             actor_profile_id=event.owner.id,
         )
-        send_firebase_multiple_messages(
+        enqueue_notification(
             f'Your event {event.name} finished',
             f'You now can rate participants',
             [event.owner.user],
@@ -522,7 +606,8 @@ def finish_event(event, data=None, serializer=None, request=None, event_url=None
             event_name=event.name,
             actor_name=event.owner.user.username,
             actor_profile_id=event.owner.id,
-            _data=json.dumps({'eventlog': eventlog.pk, 'participants': event.participants}),
+            _data=json.dumps({'eventlog': eventlog.pk,
+                               'participants': list(event.participants.values_list('id', flat=True))}),
         )
         message = f'You are finished {event} with {eventlog} in {eventlog.log_date}'
         status_code = 200
@@ -533,12 +618,12 @@ class FinishEventView(EventSubscribeView):
     permission_classes = [permissions.IsAuthenticated, IsOrganizer]
     serializer_class = FinishEventSerializer
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         event_id = kwargs.pop('pk')
         event = get_object_or_404(Event.objects.filter(active=True), pk=event_id)
-        profiles = Profile.objects.filter(active=True, user=request.user)
-        owner_profile = profiles.filter(role=Profile.Roles.organizer)
-        if owner_profile.exists() and event.owner == owner_profile.first():
+        organizer = get_roles(request).organizer
+        if organizer is not None and event.owner_id == organizer.id:
             message, status_code = finish_event(event, serializer=self.serializer_class, data=request.data, request=request)
         else:
             message = f'You are not a organizer owner'
@@ -550,13 +635,13 @@ class RateParticipantsView(EventSubscribeView):
     #TODO: implement serializer to get list of attended users and also optional rating and optional comment
     # of every participant
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         eventlog_id = kwargs.pop('pk')
         eventlog = get_object_or_404(EventLog.objects.filter(volunteers_attended__isnull=True), pk=eventlog_id)
         event = eventlog.event
-        profiles = Profile.objects.filter(active=True, user=request.user)
-        owner_profile = profiles.filter(role=Profile.Roles.organizer)
-        if owner_profile.exists() and event.owner == owner_profile.first():
+        organizer = get_roles(request).organizer
+        if organizer is not None and event.owner_id == organizer.id:
             message, status_code = finish_event(event, serializer=self.serializer_class, data=request.data, request=request)
 
         else:
@@ -569,13 +654,12 @@ class CancelEventView(EventSubscribeView):
     permission_classes = [permissions.IsAuthenticated, IsOrganizer]
     serializer_class = CancelEventSerializer
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         event_id = kwargs.pop('pk')
         event = get_object_or_404(Event, pk=event_id)
-        profiles = Profile.objects.filter(active=True, user=request.user)
-        owner_profile = profiles.filter(role=Profile.Roles.organizer)
-        if owner_profile.exists() and event.owner == owner_profile.first():
-            owner_profile = owner_profile.first()
+        owner_profile = get_roles(request).organizer
+        if owner_profile is not None and event.owner_id == owner_profile.id:
             if not event.active:
                 message = f'You are already canceled {event}'
                 status_code = 200
@@ -592,20 +676,10 @@ class CancelEventView(EventSubscribeView):
                 event.active = False
                 event.save()
                 print(' event save')
-                users_to_send = (set([participant.user for participant in event.participants.all()]) |
-                                 set([follower.user for follower in owner_profile.user.following.all()]))
-                send_firebase_multiple_messages(
+                notify_event_change(
+                    request, event,
                     f'Organizer {event.owner.user.username} has canceled event {event.name}',
                     validated_data['message'],
-                    list(users_to_send),
-                    image=request.build_absolute_uri(event.image.url),
-                    notify_type='change',
-                    to_profile=Profile.Roles.labels[event.to].capitalize(),
-                    event_id=event_id,
-                    event_to=Profile.Roles.labels[event.to].capitalize(),
-                    event_name=event.name,
-                    actor_name=event.owner.user.username,
-                    actor_profile_id=event.owner.id,
                 )
                 message = f'You are canceled {event} with {eventlog} in {eventlog.log_date}'
                 status_code = 200
@@ -619,36 +693,22 @@ class CancelEventView(EventSubscribeView):
 class ActivateEventView(EventSubscribeView):
     permission_classes = [permissions.IsAuthenticated, IsOrganizer]
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         event_id = kwargs.pop('pk')
         event = get_object_or_404(Event.objects.all(), pk=event_id)
-        profiles = Profile.objects.filter(active=True, user=request.user)
-        owner_profile = profiles.filter(role=Profile.Roles.organizer)
-        if owner_profile.exists() and event.owner == owner_profile.first():
-            owner_profile = owner_profile.first()
+        owner_profile = get_roles(request).organizer
+        if owner_profile is not None and event.owner_id == owner_profile.id:
             if event.active:
                 message = f'You are already activated {event}'
                 status_code = 200
             else:
                 event.active = True
                 event.save()
-                print(set([participant.user for participant in event.participants.all()]))
-                print(set(owner_profile.user.following.all()))
-                users_to_send = (set([participant.user for participant in event.participants.all()]) |
-                                 set([follower.user for follower in owner_profile.user.following.all()]))
-                print(users_to_send)
-                send_firebase_multiple_messages(
+                notify_event_change(
+                    request, event,
                     f'Organizer has activated event {event.name}',
                     f'Organizer {event.owner.user.username} has activated event {event.name}',
-                    list(users_to_send),
-                    image=request.build_absolute_uri(event.image.url),
-                    notify_type='change',
-                    to_profile=Profile.Roles.labels[event.to].capitalize(),
-                    event_id=event_id,
-                    event_to=Profile.Roles.labels[event.to].capitalize(),
-                    event_name=event.name,
-                    actor_name=event.owner.user.username,
-                    actor_profile_id=event.owner.id,
                 )
                 message = f'You are activated {event}'
                 status_code = 200
@@ -694,19 +754,19 @@ class UserProfileView(RetrieveAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         profile_id = kwargs.get('pk')
-        profiles = Profile.objects.filter(user=request.user)
+        roles = get_roles(request)
 
         if isinstance(profile_id, str):
             profile_id = profile_id.lower()
             if profile_id == 'me':
-                profile_id = profiles.first().pk
+                profile_id = roles.first().pk
 
             profile_id = profile_id.capitalize()
             if profile_id in Profile.Roles.labels:
                 for i, role in enumerate(Profile.Roles.labels):
                     if profile_id == role:
                         profile_id = i
-                profile_id = profiles.filter(role=profile_id).first().pk
+                profile_id = roles.profile(profile_id, active=False).pk
 
         try:
             profile = Profile.objects.filter(id=profile_id).first()
@@ -724,7 +784,7 @@ class ProfileView(viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'put', 'delete', 'head']
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwnerOrCreateOnly]
     serializer_class = ProfileSerializer
-    queryset = Profile.objects.all()
+    queryset = Profile.objects.prefetch_related('skills')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -749,10 +809,8 @@ class ProfileSubscribeView(APIView):
         profile_id = int(kwargs.pop('pk'))
         profile = get_object_or_404(Profile.objects.filter(active=True), pk=profile_id)
         user: User = User.objects.get(id=request.user.id)
-        profiles = Profile.objects.filter(active=True, user=request.user)
-        user_volunteer_or_refugee_profile = profiles.filter(
-                Q(role=Profile.Roles.refugee) | Q(role=Profile.Roles.volunteer))
-        if user_volunteer_or_refugee_profile.exists():
+        roles = get_roles(request)
+        if roles.volunteer is not None or roles.refugee is not None:
             user.following.add(profile)
             message = f'You subscribed to organizer {profile.organization}'
             status_code = 200
@@ -771,10 +829,8 @@ class ProfileUnsubscribeView(APIView):
         profile_id = int(kwargs.pop('pk'))
         profile = get_object_or_404(Profile.objects.filter(active=True), pk=profile_id)
         user: User = User.objects.get(id=request.user.id)
-        profiles = Profile.objects.filter(active=True, user=request.user)
-        user_volunteer_or_refugee_profile = profiles.filter(
-            Q(role=Profile.Roles.refugee) | Q(role=Profile.Roles.volunteer))
-        if user_volunteer_or_refugee_profile.exists():
+        roles = get_roles(request)
+        if roles.volunteer is not None or roles.refugee is not None:
             user.following.remove(profile)
             message = f'You unsubscribed to organizer {profile.organization}'
             status_code = 204
@@ -809,23 +865,65 @@ class ChangeScoresView(GenericAPIView):
         return profile
 
 
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        # counters are kept per worker process
+        if not get_roles(request).has(Profile.Roles.admin):
+            return Response(f'You are not a admin', status=403)
+        return Response({
+            'geocode': geocode_cache.get_stats(),
+            'roles': get_role_stats(),
+        })
+
+
 class CityView(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
     serializer_class = CitySerializer
     queryset = City.objects.all()
 
 
+class NearestCityView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = CitySerializer
+
+    def get(self, request):
+        try:
+            lat = float(request.query_params.get('lat'))
+            lon = float(request.query_params.get('lon'))
+        except (TypeError, ValueError):
+            raise ValidationError('lat and lon are required')
+        if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValidationError('lat should be in [-90, 90] and lon in [-180, 180]')
+        found = nearest_city(lat, lon)
+        if found is None:
+            raise Http404('there are no cities with coordinates')
+        city, distance = found
+        data = self.serializer_class(city).data
+        data['distance_km'] = distance
+        return Response(data)
+
+
 class SkillView(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
     serializer_class = SkillSerializer
     queryset = Skill.objects.all()
 
 
+class SkillTreeView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_tree())
+
+
 class CommentView(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = CommentSerializer
     queryset = Comment.objects.all()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         validated_data = serializer.validated_data
         serializer.save(user=self.request.user)
@@ -835,10 +933,8 @@ class CommentView(viewsets.ModelViewSet):
         event_to: str = Profile.Roles.labels[event.to]
 
         voter = self.request.user
-        participant = Profile.objects.filter(user=voter, role=event.to)
-        if participant.exists():
-            participant = participant.first()
-        is_participant = participant and participant in event.participants.all()
+        participant = get_roles(self.request).profile(event.to, active=False)
+        is_participant = participant and event.participants.filter(pk=participant.pk).exists()
         if not is_participant:
             return HttpResponseBadRequest(f'You are not a owner or participant of {event.name}!')
 
@@ -853,7 +949,7 @@ class CommentView(viewsets.ModelViewSet):
                     f'You are already rate {event.owner.user.username} in event {event.name}!')
             Voting.objects.create(voter=voter, applicant=event.owner, event=event, score=score)
 
-        send_firebase_multiple_messages(
+        enqueue_notification(
             f'{event_to.capitalize()} {self.request.user.username} create a review to event {event.name}',
             validated_data['text'],
             [event.owner.user, ],